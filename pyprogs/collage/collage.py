@@ -1,14 +1,18 @@
 import argparse
-import glob
 import logging
 import math
+import multiprocessing
 import os
 import sys
 import time
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime as dt
 from dotenv import load_dotenv, find_dotenv
 from PIL import Image, ImageDraw, ImageFont
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pyprogs_logging import init_worker_logging, setup_logging  # noqa: E402
+
 try:
     # Find the .env file
     dotenv_path = find_dotenv(raise_error_if_not_found=True)
@@ -29,36 +33,13 @@ log_level = os.getenv('LOG_LEVEL', 'INFO').upper()  # Default logging level: INF
 # Extract the script name without the '.py' extension
 script_name = os.path.splitext(os.path.basename(sys.argv[0]))[0]
 
-# Define the logs directory
-logs_directory = "logs"
-
-# Ensure the "logs" directory exists
-if not os.path.exists(logs_directory):
-    os.makedirs(logs_directory)
-
-# Generate a unique log filename with timestamp and script name
-timestamp = dt.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
-log_filename = os.path.join(logs_directory, f"{script_name}_{timestamp}.log")
-
-# Set up logging with timestamps and the specified logging level
-log_format = '%(asctime)s - %(levelname)s - %(message)s'
-logging.basicConfig(filename=log_filename, level=getattr(logging, log_level), format=log_format)
+# Set up logging (shared by all pyprogs scripts) with the specified logging level.
+# Thumbnail worker processes re-import this module on Windows; only the main process logs.
+if multiprocessing.parent_process() is None:
+    log_filename = setup_logging(script_name, level=log_level, max_log_files=max_log_files)
 
-
-def clean_up_old_logs():
-    global max_log_files
-
-    # Set max_log_files to 1 if it's 0 or negative
-    if max_log_files <= 0:
-        max_log_files = 1
-
-    # Remove old log files from the 'logs' subdirectory if there are more than the allowed number
-    existing_logs = glob.glob(os.path.join(logs_directory, f"{script_name}_*.log"))
-    if len(existing_logs) > max_log_files:
-        logging.info(f"existing_logs: {len(existing_logs)} > max_log_files: {max_log_files}")
-        oldest_logs = sorted(existing_logs)[:-max_log_files]
-        for old_log in oldest_logs:
-            os.remove(old_log)
+TEXT_HEIGHT = 20  # Space above the first row and under every row for the file names
+JPEG_MAX_DIMENSION = 65500  # Largest width or height a JPEG can have
 
 
 def get_formatted_duration(seconds):
@@ -94,62 +75,65 @@ def get_image_files(folder_path):
             os.path.isfile(os.path.join(folder_path, f)) and (f.endswith(b'.jpg') or f.endswith(b'.png')) and not f.decode('utf-8').startswith('!_')]
 
 
-def create_image_grid(folder_path, num_columns, thumb_size, show_text, save_output_folder, save_original_folder, output_format, jpg_quality):
-    thumb_width, thumb_height = thumb_size
-    # Determine text color based on show_text value
-    text_color = (255, 255, 255) if show_text else (0, 0, 0)
-
-    # Retrieve the image files in the folder
-    files = get_image_files(folder_path)
-
-    # Check if there are no image files
-    if not files:
-        print(f"No image files found in the folder: {folder_path.decode('utf-8')}")
-        logging.info(f"No image files found in the folder: {folder_path.decode('utf-8')}")
-        return None  # or any other action you want to take
-
-    # Calculate the number of rows needed based on the number of columns and the number of images
+def make_thumbnail(image_path, thumb_size):
+    """
+    Open an image and shrink it to fit thumb_size. This runs in a worker process. JPEGs are decoded
+    at a reduced scale with draft(), so the full-size image is never held in memory.
+    Returns (thumbnail, None), or (None, error message) if the image can't be read.
+    """
+    try:
+        with Image.open(image_path) as image:
+            # Decode JPEGs at 1/2 to 1/8 scale while keeping at least twice the thumbnail size for LANCZOS
+            image.draft('RGB', (thumb_size[0] * 2, thumb_size[1] * 2))
+            image.thumbnail(thumb_size, Image.LANCZOS)
+            return image.convert('RGB'), None
+    except Exception as e:
+        return None, str(e)
+
+
+def get_rows_per_page(num_columns, thumb_size, max_page_pixels):
+    """Number of thumbnail rows that fit on one page without going over max_page_pixels."""
+    page_width = num_columns * thumb_size[0]
+    row_height = thumb_size[1] + TEXT_HEIGHT
+    rows_by_pixels = (max_page_pixels // page_width - TEXT_HEIGHT) // row_height
+    rows_by_dimension = (JPEG_MAX_DIMENSION - TEXT_HEIGHT) // row_height
+    return max(1, min(rows_by_pixels, rows_by_dimension))
+
+
+def render_page(files, thumbnails, num_columns, thumb_size, font, text_color):
+    """
+    Paste the thumbnails for one page into a new grid image, with the file names under them.
+    thumbnails is consumed lazily, so each thumbnail can be freed as soon as it has been pasted.
+    """
     num_rows = len(files) // num_columns + (len(files) % num_columns > 0)
 
     # Create a new blank image to hold the grid
-    grid_size = (num_columns * thumb_size[0], num_rows * (thumb_size[1] + 20) + 20)
+    grid_size = (num_columns * thumb_size[0], num_rows * (thumb_size[1] + TEXT_HEIGHT) + TEXT_HEIGHT)
     grid_image = Image.new('RGB', grid_size, (0, 0, 0))
 
     # Create a drawing context
     draw = ImageDraw.Draw(grid_image)
 
-    # Calculate the font size based on the size of the thumbnail image
-    font_size = max(int(thumb_height / 16), 8)  # Ensure a minimum font size of 8
-    font_size = 12
-    font = ImageFont.truetype('arial.ttf', size=font_size)
-
     # Loop through each image and add it to the grid
-    for i, file in enumerate(files):
-        # Open the image and resize it to the thumbnail size
-        image_path = os.path.join(folder_path.decode('utf-8'), file)  # Decode folder_path to string
-        image = Image.open(image_path)
-        # Replace this line
-        # image.thumbnail(thumb_size, Image.ANTIALIAS)
-
-        # With one of these alternatives:
-        image.thumbnail(thumb_size, Image.LANCZOS)
-        # image.thumbnail(thumb_size, Image.BOX)
-
+    for i, (file, (image, error)) in enumerate(zip(files, thumbnails)):
         # Calculate the position of the image on the grid
         col_index = i % num_columns
         row_index = i // num_columns
         x = col_index * thumb_size[0]
-        y = row_index * (thumb_size[1] + 20) + 20
-        x_offset = (thumb_size[0] - image.size[0]) // 2
-        y_offset = (thumb_size[1] - image.size[1]) // 2
+        y = row_index * (thumb_size[1] + TEXT_HEIGHT) + TEXT_HEIGHT
+
+        if image is not None:
+            x_offset = (thumb_size[0] - image.size[0]) // 2
+            y_offset = (thumb_size[1] - image.size[1]) // 2
+
+            # Paste the thumbnail onto the grid
+            grid_image.paste(image, (x + x_offset, y + y_offset))
+        else:
+            print(f"Failed to open {file}: {error}")
+            logging.error(f"Failed to open {file}: {error}")
 
         # Calculate the position of the filename text
         filename = os.path.splitext(file)[0]
-        # Replace this line
-        # text_width, text_height = font.getsize(filename)
-
-        # With one of these alternatives:
-        # text_width, text_height = font.getbbox(filename)
         text_bbox = font.getbbox(filename)
         text_width = text_bbox[2] - text_bbox[0]
         text_height = text_bbox[3] - text_bbox[1]
@@ -158,10 +142,6 @@ def create_image_grid(folder_path, num_columns, thumb_size, show_text, save_outp
         text_y = y + thumb_size[1] + 5
         box_width = thumb_size[0] - 20
         box_height = text_height
-        text_y = y + thumb_size[1] + 5
-
-        # Paste the thumbnail onto the grid
-        grid_image.paste(image, (x + x_offset, y + y_offset))
 
         # Add the filename under the image
         draw.rectangle((x + 10, text_y - 2, x + 10 + box_width, text_y + box_height + 2), fill=(0, 0, 0))
@@ -174,9 +154,53 @@ def create_image_grid(folder_path, num_columns, thumb_size, show_text, save_outp
 
     # Draw horizontal lines
     for i in range(num_rows + 1):
-        y = i * (thumb_size[1] + 20) + 20
+        y = i * (thumb_size[1] + TEXT_HEIGHT) + TEXT_HEIGHT
         draw.line((0, y, grid_size[0], y), fill=(0, 0, 0))
 
+    return grid_image
+
+
+def save_grid(grid_image, image_path, output_format, jpg_quality):
+    if output_format.upper() == 'JPG':
+        grid_image.save(image_path, format='JPEG', quality=jpg_quality)
+    elif output_format.upper() == 'WEBP':
+        grid_image.save(image_path, format=output_format, lossless=True)
+    else:
+        grid_image.save(image_path, format=output_format)
+
+
+def create_image_grid(folder_path, num_columns, thumb_size, show_text, save_output_folder, save_original_folder,
+                      output_format, jpg_quality, workers=1, max_page_pixels=64_000_000, show_image=False):
+    """
+    Build the thumbnail grid for a folder one page at a time. When the grid would be larger than
+    max_page_pixels, it is split into several pages with a _pNNN suffix. Only one page and its
+    thumbnails are in memory at once. Thumbnails are made in a pool of `workers` processes.
+    Returns the paths of the saved images.
+    """
+    thumb_width, thumb_height = thumb_size
+    # Determine text color based on show_text value
+    text_color = (255, 255, 255) if show_text else (0, 0, 0)
+
+    # Retrieve the image files in the folder
+    files = get_image_files(folder_path)
+
+    # Check if there are no image files
+    if not files:
+        print(f"No image files found in the folder: {folder_path.decode('utf-8')}")
+        logging.info(f"No image files found in the folder: {folder_path.decode('utf-8')}")
+        return []
+
+    # Split the rows over as many pages as needed to keep each page under max_page_pixels
+    num_rows = len(files) // num_columns + (len(files) % num_columns > 0)
+    rows_per_page = get_rows_per_page(num_columns, thumb_size, max_page_pixels)
+    num_pages = math.ceil(num_rows / rows_per_page)
+    files_per_page = rows_per_page * num_columns
+
+    # Calculate the font size based on the size of the thumbnail image
+    font_size = max(int(thumb_height / 16), 8)  # Ensure a minimum font size of 8
+    font_size = 12
+    font = ImageFont.truetype('arial.ttf', size=font_size)
+
     # Create an output folder based on the script location
     output_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "output")
     if not os.path.exists(output_folder):
@@ -184,35 +208,54 @@ def create_image_grid(folder_path, num_columns, thumb_size, show_text, save_outp
 
     print(f"save_output_folder: {save_output_folder}")
     print(f"save_original_folder: {save_original_folder}")
-
-    # Save in the output folder with a timestamp if specified
-    if save_output_folder:
-        timestamp = dt.now().strftime('%Y%m%d%H%M%S')
-        final_image_name = f"!_{os.path.basename(folder_path.decode('utf-8'))}_grid_{timestamp}"
-        final_image_path_output = os.path.join(output_folder, final_image_name + f".{output_format.lower()}")
-        if output_format.upper() == 'JPG':
-            grid_image.save(final_image_path_output, format=output_format, quality=jpg_quality)
-        elif output_format.upper() == 'WEBP':
-            grid_image.save(final_image_path_output, format=output_format, lossless=True)
-        else:
-            grid_image.save(final_image_path_output, format=output_format)
-        print(f"Final grid image saved in the output folder as {final_image_path_output}")
-        logging.info(f"Final grid image saved in the output folder as {final_image_path_output}")
-
-    # Save in the original folder if specified
-    if save_original_folder:
-        final_image_name = f"!_{os.path.basename(folder_path.decode('utf-8'))}_grid"
-        final_image_path_original = os.path.join(folder_path.decode('utf-8'), final_image_name + f".{output_format.lower()}")
-        if output_format.upper() == 'JPG':
-            grid_image.save(final_image_path_original, format=output_format, quality=jpg_quality)
-        elif output_format.upper() == 'WEBP':
-            grid_image.save(final_image_path_original, format=output_format, lossless=True)
-        else:
-            grid_image.save(final_image_path_original, format=output_format)
-        print(f"Final grid image saved in the original folder as {final_image_path_original}")
-        logging.info(f"Final grid image saved in the original folder as {final_image_path_original}")
-
-    return grid_image
+    if num_pages > 1:
+        print(f"Splitting {len(files)} images over {num_pages} pages of {rows_per_page} rows")
+        logging.info(f"Splitting {len(files)} images over {num_pages} pages of {rows_per_page} rows")
+
+    folder_name = os.path.basename(folder_path.decode('utf-8'))
+    timestamp = dt.now().strftime('%Y%m%d%H%M%S')
+    saved_paths = []
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker_logging) if workers > 1 else None
+    try:
+        for page_index in range(num_pages):
+            page_files = files[page_index * files_per_page:(page_index + 1) * files_per_page]
+            image_paths = [os.path.join(folder_path.decode('utf-8'), file) for file in page_files]
+            if executor:
+                thumbnails = executor.map(make_thumbnail, image_paths, [thumb_size] * len(image_paths),
+                                          chunksize=max(1, min(32, len(image_paths) // (workers * 4))))
+            else:
+                thumbnails = (make_thumbnail(image_path, thumb_size) for image_path in image_paths)
+            grid_image = render_page(page_files, thumbnails, num_columns, thumb_size, font, text_color)
+            page_suffix = f"_p{page_index + 1:03d}" if num_pages > 1 else ""
+
+            # Save in the output folder with a timestamp if specified
+            if save_output_folder:
+                final_image_name = f"!_{folder_name}_grid_{timestamp}{page_suffix}"
+                final_image_path_output = os.path.join(output_folder, final_image_name + f".{output_format.lower()}")
+                save_grid(grid_image, final_image_path_output, output_format, jpg_quality)
+                saved_paths.append(final_image_path_output)
+                print(f"Final grid image saved in the output folder as {final_image_path_output}")
+                logging.info(f"Final grid image saved in the output folder as {final_image_path_output}")
+
+            # Save in the original folder if specified
+            if save_original_folder:
+                final_image_name = f"!_{folder_name}_grid{page_suffix}"
+                final_image_path_original = os.path.join(folder_path.decode('utf-8'), final_image_name + f".{output_format.lower()}")
+                save_grid(grid_image, final_image_path_original, output_format, jpg_quality)
+                saved_paths.append(final_image_path_original)
+                print(f"Final grid image saved in the original folder as {final_image_path_original}")
+                logging.info(f"Final grid image saved in the original folder as {final_image_path_original}")
+
+            # Show the grid image if specified
+            if show_image:
+                grid_image.show()
+
+            grid_image.close()
+    finally:
+        if executor:
+            executor.shutdown()
+
+    return saved_paths
 
 
 if __name__ == "__main__":
@@ -229,6 +272,10 @@ if __name__ == "__main__":
     parser.add_argument("--save_original_folder", default=False, type=str_to_bool, help="Save the grid image in the original folder")
     parser.add_argument("--output_format", type=str, choices=["PNG", "JPG", "WEBP"], default="JPG", help="Output format (default JPG)")
     parser.add_argument("--jpg_quality", type=int, default=95, help="Quality for JPG format (default 95)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="Number of processes making thumbnails (default 0, one per CPU)")
+    parser.add_argument("--max_page_megapixels", type=int, default=64,
+                        help="Split the grid into pages of at most this many megapixels (default 64)")
 
     args = parser.parse_args()
 
@@ -252,19 +299,14 @@ if __name__ == "__main__":
         show_text = args.show_text if args.show_text is not None else True
 
         # Create the image grid
-        grid_image = create_image_grid(
+        workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+        create_image_grid(
             folder_path, num_columns, thumb_size, show_text,
             args.save_output_folder, args.save_original_folder,
-            args.output_format, args.jpg_quality
+            args.output_format, args.jpg_quality, workers=workers,
+            max_page_pixels=args.max_page_megapixels * 1_000_000, show_image=args.show_image
         )
 
-        # Call the clean_up_old_logs function
-        clean_up_old_logs()
-
-        # Show the grid image if specified
-        if args.show_image:
-            grid_image.show()
-
         end_time = time.time()  # Record the end time after script execution
         script_duration = end_time - start_time
 
@@ -1,14 +1,15 @@
 import argparse
-import glob
 import logging
 import os
 import sys
 import time
-from datetime import datetime as dt
 from dotenv import load_dotenv, find_dotenv
 from PIL import Image
 from PIL.ExifTags import TAGS
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pyprogs_logging import setup_logging  # noqa: E402
+
 try:
     # Find the .env file
     dotenv_path = find_dotenv(raise_error_if_not_found=True)
@@ -29,36 +30,8 @@ log_level = os.getenv('LOG_LEVEL', 'INFO').upper()  # Default logging level: INF
 # Extract the script name without the '.py' extension
 script_name = os.path.splitext(os.path.basename(sys.argv[0]))[0]
 
-# Define the logs directory
-logs_directory = "logs"
-
-# Ensure the "logs" directory exists
-if not os.path.exists(logs_directory):
-    os.makedirs(logs_directory)
-
-# Generate a unique log filename with timestamp and script name
-timestamp = dt.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
-log_filename = os.path.join(logs_directory, f"{script_name}_{timestamp}.log")
-
-# Set up logging with timestamps and the specified logging level
-log_format = '%(asctime)s - %(levelname)s - %(message)s'
-logging.basicConfig(filename=log_filename, level=getattr(logging, log_level), format=log_format)
-
-
-def clean_up_old_logs():
-    global max_log_files
-
-    # Set max_log_files to 1 if it's 0 or negative
-    if max_log_files <= 0:
-        max_log_files = 1
-
-    # Remove old log files from the 'logs' subdirectory if there are more than the allowed number
-    existing_logs = glob.glob(os.path.join(logs_directory, f"{script_name}_*.log"))
-    if len(existing_logs) > max_log_files:
-        logging.info(f"existing_logs: {len(existing_logs)} > max_log_files: {max_log_files}")
-        oldest_logs = sorted(existing_logs)[:-max_log_files]
-        for old_log in oldest_logs:
-            os.remove(old_log)
+# Set up logging (shared by all pyprogs scripts) with the specified logging level
+log_filename = setup_logging(script_name, level=log_level, max_log_files=max_log_files)
 
 
 def get_formatted_duration(seconds):
@@ -180,5 +153,3 @@ if __name__ == "__main__":
         input_folder = args.input_folder
 
     main(input_folder, args.verbose)
-    # Call the clean_up_old_logs function
-    clean_up_old_logs()
@@ -1,12 +1,14 @@
 import os
 import logging
 import plexapi
-import glob
-from logging.handlers import RotatingFileHandler
+import sys
 from plexapi.server import PlexServer
 from dotenv import load_dotenv
 import time
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pyprogs_logging import setup_logging  # noqa: E402
+
 # Load environment variables
 load_dotenv()
 
@@ -18,18 +20,7 @@ LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 
 # Setup Logging
 script_name = os.path.splitext(os.path.basename(__file__))[0]
-logs_directory = "logs"
-os.makedirs(logs_directory, exist_ok=True)
-
-timestamp = time.strftime("%Y%m%d_%H%M%S")
-log_filename = os.path.join(logs_directory, f"{script_name}_{timestamp}.log")
-log_format = '%(asctime)s - %(levelname)s - %(message)s'
-
-logging.basicConfig(level=LOG_LEVEL, format=log_format)
-file_handler = RotatingFileHandler(log_filename, maxBytes=5 * 1024 * 1024, backupCount=MAX_LOG_FILES)
-file_handler.setFormatter(logging.Formatter(log_format))
-logging.getLogger().addHandler(file_handler)
-
+log_filename = setup_logging(script_name, level=LOG_LEVEL, max_log_files=MAX_LOG_FILES, console=True)
 logger = logging.getLogger()
 
 
@@ -159,15 +150,6 @@ def select_episode(season):
             print("Invalid input! Please enter a valid number.")
 
 
-def clean_up_old_logs():
-    """Clean up old logs if they exceed the maximum allowed."""
-    existing_logs = glob.glob(os.path.join(logs_directory, f"{script_name}_*.log"))
-    if len(existing_logs) > MAX_LOG_FILES:
-        oldest_logs = sorted(existing_logs)[:-MAX_LOG_FILES]
-        for old_log in oldest_logs:
-            os.remove(old_log)
-
-
 def manage_labels(item, item_type):
     """Manage labels for a specific item (show, season, or episode) with retries and enhanced handling."""
     if not item.labels:
@@ -296,7 +278,6 @@ def main():
         print(f"An error occurred: {e}")
         logger.critical(f"Critical error: {e}")
     finally:
-        clean_up_old_logs()
         logger.info("Script execution completed.")
 
 
@@ -1,15 +1,24 @@
 import os
 import logging
-from logging.handlers import RotatingFileHandler
+import sys
 from dotenv import load_dotenv, find_dotenv
 from plexapi.server import PlexServer
 from PIL import Image
 from io import BytesIO
+from urllib.parse import quote
 import requests
 import time
-import glob
 import gc
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib
+import json
+import threading
+import queue
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pyprogs_logging import init_worker_logging, setup_logging  # noqa: E402
 
 # Load environment variables
 dotenv_path = find_dotenv(raise_error_if_not_found=True)
@@ -20,6 +29,10 @@ PLEX_TOKEN = os.getenv("PLEX_TOKEN")
 PLEX_TIMEOUT = int(os.getenv("PLEX_TIMEOUT", 60))
 MAX_LOG_FILES = int(os.getenv("MAX_LOG_FILES", 10))
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", 20))  # Default: 20 images downloading at once
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", os.cpu_count() or 4))  # Default: one resize process per CPU
+PAGE_SIZE = int(os.getenv("PAGE_SIZE", 500))  # Default: 500 items per Plex library request
+FETCH_MODE = os.getenv("FETCH_MODE", "full").lower()  # Default: full (download the original art)
 
 # Persistent HTTP Session
 SESSION = requests.Session()
@@ -27,47 +40,231 @@ SESSION.headers.update({"Accept": "application/json"})
 
 # Logging setup
 script_name = os.path.splitext(os.path.basename(__file__))[0]
-logs_directory = "logs"
-if not os.path.exists(logs_directory):
-    os.makedirs(logs_directory)
-
-timestamp = time.strftime("%Y%m%d_%H%M%S")
-log_filename = os.path.join(logs_directory, f"{script_name}_{timestamp}.log")
-log_format = '%(asctime)s - %(levelname)s - %(message)s'
-
-logging.basicConfig(level=LOG_LEVEL, format=log_format)
-file_handler = RotatingFileHandler(log_filename, maxBytes=5 * 1024 * 1024, backupCount=MAX_LOG_FILES)
-file_handler.setFormatter(logging.Formatter(log_format))
-logging.getLogger().addHandler(file_handler)
-
+if multiprocessing.parent_process() is None:  # Resize worker processes re-import this module on Windows
+    log_filename = setup_logging(script_name, level=LOG_LEVEL, max_log_files=MAX_LOG_FILES, console=True)
 logger = logging.getLogger()
 
 ASPECT_RATIO = 16 / 9  # 1.77777778
+SOURCE_SIZE = (1920, 1080)  # 16:9 art is scaled to this size before the portrait window is cropped
+CROP_BOX = (600, 0, 1320, 1080)  # Portrait window in the middle of SOURCE_SIZE
 OUTPUT_FOLDER = "output"
+MANIFEST_FILE = os.path.join(OUTPUT_FOLDER, ".ltp_manifest.json")
 
 # Ensure the output folder exists
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 created_dirs = set()
+dirs_lock = threading.Lock()
+stats_lock = threading.Lock()
+
+# One image to produce: a Plex art/thumb path and the file it is turned into
+ImageJob = namedtuple("ImageJob", ["title", "source", "output_path"])
 
+# Compact records for library items; only the fields this script uses are kept
+MediaItem = namedtuple("MediaItem", ["rating_key", "type", "title", "art", "folder"])
+EpisodeItem = namedtuple("EpisodeItem", ["show_key", "title", "season", "index", "thumb"])
+PLEX_TYPES = {"movie": 1, "show": 2, "episode": 4}
 
-def clean_up_old_logs():
-    """Clean up old logs if they exceed the maximum allowed."""
-    existing_logs = glob.glob(os.path.join(logs_directory, f"{script_name}_*.log"))
-    if len(existing_logs) > MAX_LOG_FILES:
-        oldest_logs = sorted(existing_logs)[:-MAX_LOG_FILES]
-        for old_log in oldest_logs:
-            os.remove(old_log)
 
+def count(stats, key, amount=1):
+    """Update a stats counter; jobs for the same library finish on different threads."""
+    with stats_lock:
+        stats[key] += amount
 
-def process_items_parallel(items, process_function, *args):
-    """Process items in parallel using ThreadPoolExecutor."""
-    with ThreadPoolExecutor(max_workers=20) as executor:  # Adjust the number of workers based on system resources
-        futures = [executor.submit(process_function, item, *args) for item in items]
-        for future in as_completed(futures):
+
+def download_image(source):
+    """
+    Download a Plex art/thumb path and return the raw image bytes.
+    With FETCH_MODE=transcode, Plex scales the image to SOURCE_SIZE first, so a 4K background
+    is sent as a 1920x1080 JPEG. The original is downloaded instead when the transcode fails
+    or doesn't come back as 16:9, since only 16:9 art is cropped at that size.
+    """
+    if FETCH_MODE == "transcode":
+        try:
+            data = fetch_from_plex(
+                f"/photo/:/transcode?url={quote(source, safe='')}"
+                f"&width={SOURCE_SIZE[0]}&height={SOURCE_SIZE[1]}&minSize=1&upscale=0"
+            )
+            width, height = Image.open(BytesIO(data)).size  # Only reads the header
+            if abs(width / height - ASPECT_RATIO) < 0.01:
+                return data
+            logger.debug(f"Transcoded image for {source} is {width}x{height}, downloading the original")
+        except Exception as e:
+            logger.debug(f"Transcode failed for {source}, downloading the original: {e}")
+    return fetch_from_plex(source)
+
+
+def fetch_from_plex(path):
+    """GET a Plex path and return the response body."""
+    separator = "&" if "?" in path else "?"
+    response = SESSION.get(f"{PLEX_URL}{path}{separator}X-Plex-Token={PLEX_TOKEN}", timeout=PLEX_TIMEOUT)
+    response.raise_for_status()
+    return response.content
+
+
+def render_poster(data, target_width=1000, target_height=1500):
+    """Decode, crop and resize a landscape image and return it encoded as JPEG."""
+    image = Image.open(BytesIO(data))
+    resized_image = resize_and_crop(image, target_width, target_height)
+    if resized_image.mode != "RGB":  # e.g. PNG art with transparency, which JPEG can't store
+        resized_image = resized_image.convert("RGB")
+    output = BytesIO()
+    resized_image.save(output, format="JPEG", quality=95)
+    return output.getvalue()
+
+
+class ImagePipeline:
+    """
+    Staged pipeline for image jobs from every library, show and episode:
+    downloads run on MAX_WORKERS threads, decode/crop/resize/encode in a pool of CPU_WORKERS processes
+    (so it isn't serialized by the GIL), and a single writer thread saves the results.
+    A show with 1,000 episodes is spread over all workers instead of pinning one of them.
+    At most MAX_WORKERS * 2 jobs are between submit and write at any time, and the write queue is
+    bounded as well, so memory stays flat however large the library is. Submitting blocks until a slot frees up.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, cpu_workers=CPU_WORKERS):
+        self.download_pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="download")
+        # CPU_WORKERS=0 renders on the download threads instead of in separate processes
+        self.cpu_pool = None
+        if cpu_workers > 0:
+            self.cpu_pool = ProcessPoolExecutor(max_workers=cpu_workers, initializer=init_worker_logging)
+        self.slots = threading.BoundedSemaphore(max_workers * 2)
+        self.write_queue = queue.Queue(maxsize=max_workers)
+        self.pending = 0
+        self.idle = threading.Condition()
+        self.writer = threading.Thread(target=self._write_loop, name="writer", daemon=True)
+        self.writer.start()
+
+    def submit(self, job, stats, cache):
+        self.slots.acquire()
+        with self.idle:
+            self.pending += 1
+        self.download_pool.submit(self._download, job, stats, cache)
+
+    def _finish(self, job, stats, error=None):
+        if error is not None:
+            logger.error(f"Error processing '{job.title}': {error}")
+            count(stats, "errors")
+        self.slots.release()
+        with self.idle:
+            self.pending -= 1
+            if self.pending == 0:
+                self.idle.notify_all()
+
+    def _download(self, job, stats, cache):
+        try:
+            data = download_image(job.source)
+            if self.cpu_pool is None:
+                self.write_queue.put((job, stats, cache, render_poster(data)))
+                return
+            future = self.cpu_pool.submit(render_poster, data)
+            future.add_done_callback(lambda done: self._rendered(job, stats, cache, done))
+        except Exception as e:
+            self._finish(job, stats, e)
+
+    def _rendered(self, job, stats, cache, future):
+        try:
+            self.write_queue.put((job, stats, cache, future.result()))
+        except Exception as e:
+            self._finish(job, stats, e)
+
+    def _write_loop(self):
+        while True:
+            item = self.write_queue.get()
+            if item is None:
+                return
+            job, stats, cache, encoded = item
             try:
-                future.result()
+                if cache.store(job.output_path, job.source, encoded):
+                    logger.info(f"Saved: {job.output_path}")
+                else:
+                    logger.info(f"New art gave an identical image, kept: {job.output_path}")
+                count(stats, "processed")
+                self._finish(job, stats)
             except Exception as e:
-                logger.error(f"Error in parallel processing: {e}")
+                self._finish(job, stats, e)
+
+    def wait(self):
+        """Wait until every submitted job has been written or has failed."""
+        with self.idle:
+            self.idle.wait_for(lambda: self.pending == 0)
+
+    def shutdown(self):
+        self.wait()
+        self.download_pool.shutdown()
+        if self.cpu_pool is not None:
+            self.cpu_pool.shutdown()
+        self.write_queue.put(None)
+        self.writer.join()
+
+
+class ArtworkCache:
+    """
+    Persistent manifest of generated files: output path -> the Plex art/thumb path it was made from
+    and the SHA-1 of the file. Plex art paths end in the upload timestamp (/library/metadata/1/art/1700000000),
+    so a different path means new art. Unchanged items are skipped without any request or disk access.
+    """
+
+    def __init__(self, manifest_file, output_folder):
+        self.manifest_file = manifest_file
+        self.entries = {}
+        if os.path.exists(manifest_file):
+            try:
+                with open(manifest_file, "r", encoding="utf-8") as file:
+                    self.entries = json.load(file)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read {manifest_file}, starting a new manifest: {e}")
+        self.existing = build_file_cache(output_folder)
+        self.lock = threading.Lock()
+        self.dirty = False
+
+    def needs_update(self, output_path, source):
+        """Return True if output_path doesn't exist yet or was made from different art."""
+        with self.lock:
+            if output_path not in self.existing:
+                return True
+            entry = self.entries.get(output_path)
+            if entry is None:
+                # Made before the manifest existed; assume it matches the current art
+                self.entries[output_path] = {"source": source, "sha1": None}
+                self.dirty = True
+                return False
+            if entry["source"] != source:
+                logger.info(f"Art changed in Plex, regenerating: {output_path}")
+                return True
+            return False
+
+    def store(self, output_path, source, data):
+        """
+        Write data to output_path and record it. The write is skipped when the file already has
+        identical content. Returns True if the file was written.
+        """
+        sha1 = hashlib.sha1(data).hexdigest()
+        with self.lock:
+            entry = self.entries.get(output_path)
+            unchanged = entry is not None and entry["sha1"] == sha1 and output_path in self.existing
+        if not unchanged:
+            temp_path = f"{output_path}.tmp"
+            with open(temp_path, "wb") as file:
+                file.write(data)
+            os.replace(temp_path, output_path)
+        with self.lock:
+            self.entries[output_path] = {"source": source, "sha1": sha1}
+            self.existing.add(output_path)
+            self.dirty = True
+        return not unchanged
+
+    def save(self):
+        """Write the manifest if anything changed."""
+        with self.lock:
+            if not self.dirty:
+                return
+            temp_path = f"{self.manifest_file}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(self.entries, file, indent=1, sort_keys=True)
+            os.replace(temp_path, self.manifest_file)
+            self.dirty = False
+        logger.info(f"Saved manifest with {len(self.entries)} files to {self.manifest_file}")
 
 
 def build_file_cache(output_folder):
@@ -80,27 +277,26 @@ def build_file_cache(output_folder):
 
 
 def safe_makedirs(directory):
-    if directory not in created_dirs:
-        os.makedirs(directory, exist_ok=True)
-        created_dirs.add(directory)
+    with dirs_lock:
+        if directory not in created_dirs:
+            os.makedirs(directory, exist_ok=True)
+            created_dirs.add(directory)
 
 
 def get_media_folder(media):
     """
-    Retrieve the Plex folder location for a media item.
-    For movies, return the parent folder of the first location.
+    Retrieve the Plex folder name for a movie or show from its library JSON.
+    For movies, return the parent folder of the first file.
     For TV shows, return the root folder from locations.
-    For episodes, return the show's root folder.
     """
     try:
-        if media["type"] == "movie":
-            # Use the parent folder of the first location for movies
-            full_path = media["locations"][0]
+        if media.get("type") == "movie":
+            # Use the parent folder of the first file for movies
+            full_path = media["Media"][0]["Part"][0]["file"]
             return os.path.basename(os.path.dirname(full_path))  # Extract folder name
-        elif media["type"] == "show" or media["type"] == "episode":
-            # Use the root folder for TV shows and episodes
-            if "locations" in media and media["locations"]:
-                return os.path.basename(media["locations"][0])  # Show folder name
+        elif media.get("type") == "show" and media.get("Location"):
+            # Use the root folder for TV shows
+            return os.path.basename(media["Location"][0]["path"])  # Show folder name
         # Fallback for unknown types
         return media.get("title", "Unknown")
     except Exception as e:
@@ -108,6 +304,42 @@ def get_media_folder(media):
         return media.get("title", "Unknown")
 
 
+def iter_container(path, params=None, page_size=PAGE_SIZE):
+    """
+    Yield the Metadata entries of a Plex container one page at a time, using
+    X-Plex-Container-Start/Size, so only one page of JSON is held in memory.
+    """
+    start = 0
+    while True:
+        response = SESSION.get(
+            f"{PLEX_URL}{path}",
+            params={**(params or {}), "X-Plex-Token": PLEX_TOKEN},
+            headers={"X-Plex-Container-Start": str(start), "X-Plex-Container-Size": str(page_size)},
+            timeout=PLEX_TIMEOUT,
+        )
+        response.raise_for_status()
+        container = response.json().get("MediaContainer", {})
+        entries = container.get("Metadata", [])
+        yield from entries
+        start += len(entries)
+        if not entries or start >= container.get("totalSize", start):
+            return
+
+
+def iter_library_items(library_key, libtype):
+    """Yield a MediaItem for every movie or show in a library section."""
+    for data in iter_container(f"/library/sections/{library_key}/all", {"type": PLEX_TYPES[libtype]}):
+        yield MediaItem(data.get("ratingKey"), libtype, data.get("title", "Unknown"), data.get("art"),
+                        get_media_folder(data))
+
+
+def iter_episodes(path, params=None):
+    """Yield an EpisodeItem for every episode in a container (a whole library or one show)."""
+    for data in iter_container(path, params):
+        yield EpisodeItem(data.get("grandparentRatingKey"), data.get("title", "Unknown"),
+                          data.get("parentIndex"), data.get("index"), data.get("thumb"))
+
+
 def select_from_list(items, prompt, include_all=False):
     """Display a numbered list of items and allow the user to select one."""
     while True:
@@ -127,14 +359,22 @@ def select_from_list(items, prompt, include_all=False):
 
 
 def resize_and_crop(image, target_width, target_height):
-    """Resize and crop an image to the specified dimensions."""
+    """
+    Resize and crop an image to the specified dimensions.
+    16:9 art is cropped to the portrait window it would have at SOURCE_SIZE and resized in one pass.
+    For JPEGs, draft() first lets the decoder scale down by 1/2, 1/4 or 1/8 (never below SOURCE_SIZE),
+    so a 4K background isn't fully decoded only to be shrunk again.
+    """
     width, height = image.size
     ratio = width / height
 
     if abs(ratio - ASPECT_RATIO) < 0.01:
-        image = image.resize((1920, 1080), Image.LANCZOS)
+        image.draft("RGB", SOURCE_SIZE)  # No-op for formats other than JPEG
+        scale = image.size[0] / SOURCE_SIZE[0]
+        box = tuple(edge * scale for edge in CROP_BOX)
+        return image.resize((target_width, target_height), Image.LANCZOS, box=box)
 
-    return image.crop((600, 0, 1320, 1080)).resize((target_width, target_height), Image.LANCZOS)
+    return image.crop(CROP_BOX).resize((target_width, target_height), Image.LANCZOS)
 
 
 def get_libraries_from_env():
@@ -167,154 +407,117 @@ def process_libraries(plex, libraries_from_env):
     return selected_libraries
 
 
-def process_library(library, stats, file_cache):
+def process_library(library, stats, cache, pipeline):
     """
-    Process an entire Plex library with optimized metadata fetching.
+    Queue the image jobs for an entire Plex library. Items are streamed page by page,
+    and for TV libraries all episodes are listed with one paged request instead of one per show.
+    Returns once every job is queued; the caller waits for the pipeline to finish them.
+    If Plex fails to return a page, the error is logged and counted and the rest of the library is skipped.
     """
     library_name = library.title
     logger.info(f"Processing library: {library_name}")
 
-    # Fetch all items in one request
-    all_items = fetch_limited_metadata(library)
-    stats["total"] += len(all_items)
-    logger.info(f"Fetched {len(all_items)} items from library '{library_name}'.")
-
-    # Use parallelism to process items
-    if library.type == "movie":
-        process_items_parallel(all_items, process_movie, library_name, stats, file_cache)
-    elif library.type == "show":
-        process_items_parallel(all_items, process_tv_show, library_name, stats, file_cache)
-
-
-def fetch_limited_metadata(library):
-    """
-    Fetch all items from a Plex library and limit the metadata fields manually.
-    """
     try:
-        items = library.all()  # Fetch all items from the library
-        limited_metadata = []
-        for item in items:
-            limited_item = {
-                "title": item.title,
-                "art": getattr(item, "art", None),
-                "thumb": getattr(item, "thumb", None),
-                "type": item.type,
-                "locations": getattr(item, "locations", []),
-                "plex_object": item,  # Add original PlexAPI object
-            }
-            limited_metadata.append(limited_item)
-        return limited_metadata
-    except Exception as e:
-        logger.error(f"Error fetching limited metadata: {e}")
-        return []
-
-
-def process_movie(movie, library_name, stats, file_cache):
-    """Process a movie and create a poster.jpg using its background art."""
+        if library.type == "movie":
+            for movie in iter_library_items(library.key, "movie"):
+                count(stats, "total")
+                process_movie(movie, library_name, stats, cache, pipeline)
+        elif library.type == "show":
+            show_folders = {}
+            for show in iter_library_items(library.key, "show"):
+                count(stats, "total")
+                show_folders[show.rating_key] = process_show_poster(show, library_name, stats, cache, pipeline)
+            episodes = iter_episodes(f"/library/sections/{library.key}/all", {"type": PLEX_TYPES["episode"]})
+            for episode in episodes:
+                count(stats, "total")
+                show_folder = show_folders.get(episode.show_key)
+                if show_folder is None:
+                    logger.warning(f"Skipping episode '{episode.title}': Show not found in library.")
+                    count(stats, "skipped")
+                    continue
+                process_episode(episode, show_folder, stats, cache, pipeline)
+    except (requests.RequestException, ValueError) as e:
+        # A failed page (timeout, 5xx or bad JSON) ends this library; jobs already queued still run
+        logger.error(f"Error listing library '{library_name}', continuing with the next one: {e}")
+        count(stats, "errors")
+        return
+
+    logger.info(f"Queued all items from library '{library_name}'.")
+
+
+def process_movie(movie, library_name, stats, cache, pipeline):
+    """Queue a poster.jpg for a movie made from its background art."""
     try:
-        if not movie.get("art"):
-            logger.warning(f"Skipping {movie.get('title', 'Unknown')}: No background art available.")
-            stats["skipped"] += 1
+        if not movie.art:
+            logger.warning(f"Skipping {movie.title}: No background art available.")
+            count(stats, "skipped")
             return
 
-        movie_folder = os.path.join(OUTPUT_FOLDER, library_name, get_media_folder(movie))
-        safe_makedirs(movie_folder)
-        # os.makedirs(movie_folder, exist_ok=True)
+        movie_folder = os.path.join(OUTPUT_FOLDER, library_name, movie.folder)
         output_path = os.path.join(movie_folder, "poster.jpg")
 
-        if output_path in file_cache:
-            logger.info(f"File already exists, skipping: {output_path}")
-            stats["skipped"] += 1
+        if not cache.needs_update(output_path, movie.art):
+            logger.info(f"Up to date, skipping: {output_path}")
+            count(stats, "skipped")
             return
 
-        art_url = f"{PLEX_URL}{movie['art']}?X-Plex-Token={PLEX_TOKEN}"
-        response = SESSION.get(art_url, timeout=PLEX_TIMEOUT)
-        response.raise_for_status()
-
-        image = Image.open(BytesIO(response.content))
-        resized_image = resize_and_crop(image, 1000, 1500)
-
-        resized_image.save(output_path, format="JPEG", quality=95)
-        file_cache.add(output_path)
-        logger.info(f"Saved: {output_path}")
-        stats["processed"] += 1
+        safe_makedirs(movie_folder)
+        pipeline.submit(ImageJob(movie.title, movie.art, output_path), stats, cache)
     except Exception as e:
-        logger.error(f"Error processing {movie.get('title', 'Unknown')}: {e}")
-        stats["errors"] += 1
+        logger.error(f"Error processing {movie.title}: {e}")
+        count(stats, "errors")
 
 
-def process_tv_show(show, library_name, stats, file_cache):
-    """Process a TV show, create a poster for the show, and generate episode cards."""
+def process_show_poster(show, library_name, stats, cache, pipeline):
+    """Queue a poster for a TV show and return the show's output folder."""
+    show_folder = os.path.join(OUTPUT_FOLDER, library_name, show.folder)
     try:
-        # Create the folder for the show
-        show_folder = os.path.join(OUTPUT_FOLDER, library_name, get_media_folder(show))
         safe_makedirs(show_folder)
-        # os.makedirs(show_folder, exist_ok=True)
-
-        # Process the show's poster
         poster_path = os.path.join(show_folder, "poster.jpg")
-        if poster_path not in file_cache:
-            try:
-                if not show.get("art"):
-                    logger.warning(f"Skipping poster creation for {show.get('title', 'Unknown')}: No background art.")
-                    stats["skipped"] += 1
-                else:
-                    art_url = f"{PLEX_URL}{show['art']}?X-Plex-Token={PLEX_TOKEN}"
-                    response = SESSION.get(art_url, timeout=PLEX_TIMEOUT)
-                    response.raise_for_status()
-
-                    image = Image.open(BytesIO(response.content))
-                    resized_image = resize_and_crop(image, 1000, 1500)
-
-                    resized_image.save(poster_path, format="JPEG", quality=95)
-                    file_cache.add(poster_path)
-                    logger.info(f"Saved: {poster_path}")
-                    stats["processed"] += 1
-            except Exception as e:
-                logger.error(f"Error creating poster for show '{show.get('title', 'Unknown')}': {e}")
-                stats["errors"] += 1
+        if not show.art:
+            logger.warning(f"Skipping poster creation for {show.title}: No background art.")
+            count(stats, "skipped")
+        elif not cache.needs_update(poster_path, show.art):
+            logger.info(f"Up to date, skipping: {poster_path}")
+            count(stats, "skipped")
         else:
-            logger.info(f"File already exists, skipping: {poster_path}")
-            stats["skipped"] += 1
-
-        # Fetch and process episodes using the PlexAPI object
-        plex_show = show["plex_object"]
-        episodes = plex_show.episodes()  # Fetch episodes directly
-        stats["total"] += len(episodes)
-
-        for episode in episodes:
-            # Include season and episode numbers in the filename
-            episode_path = os.path.join(
-                show_folder,
-                f"S{episode.seasonNumber:02}E{episode.index:02}.jpg"
-            )
-            if episode_path in file_cache:
-                logger.info(f"File already exists, skipping: {episode_path}")
-                stats["skipped"] += 1
-                continue
-
-            if episode.thumb:
-                try:
-                    thumb_url = f"{PLEX_URL}{episode.thumb}?X-Plex-Token={PLEX_TOKEN}"
-                    response = SESSION.get(thumb_url, timeout=PLEX_TIMEOUT)
-                    response.raise_for_status()
-
-                    image = Image.open(BytesIO(response.content))
-                    resized_image = resize_and_crop(image, 1000, 1500)
-
-                    resized_image.save(episode_path, format="JPEG", quality=95)
-                    file_cache.add(episode_path)
-                    logger.info(f"Saved: {episode_path}")
-                    stats["processed"] += 1
-                except Exception as e:
-                    logger.error(f"Error processing episode '{episode.title}': {e}")
-                    stats["errors"] += 1
-            else:
-                logger.warning(f"Skipping episode '{episode.title}': No thumbnail available.")
-                stats["skipped"] += 1
+            pipeline.submit(ImageJob(show.title, show.art, poster_path), stats, cache)
+    except Exception as e:
+        logger.error(f"Error creating poster for show '{show.title}': {e}")
+        count(stats, "errors")
+    return show_folder
+
+
+def process_episode(episode, show_folder, stats, cache, pipeline):
+    """Queue a title card for an episode, named after its season and episode numbers."""
+    if not episode.thumb:
+        logger.warning(f"Skipping episode '{episode.title}': No thumbnail available.")
+        count(stats, "skipped")
+        return
+    if episode.season is None or episode.index is None:
+        logger.warning(f"Skipping episode '{episode.title}': No season or episode number.")
+        count(stats, "skipped")
+        return
+
+    # Include season and episode numbers in the filename
+    episode_path = os.path.join(show_folder, f"S{episode.season:02}E{episode.index:02}.jpg")
+    if not cache.needs_update(episode_path, episode.thumb):
+        logger.info(f"Up to date, skipping: {episode_path}")
+        count(stats, "skipped")
+        return
+    pipeline.submit(ImageJob(episode.title, episode.thumb, episode_path), stats, cache)
+
+
+def process_tv_show(show, library_name, stats, cache, pipeline):
+    """Queue a poster for a single TV show and a card for each of its episodes."""
+    show_folder = process_show_poster(show, library_name, stats, cache, pipeline)
+    try:
+        for episode in iter_episodes(f"/library/metadata/{show.rating_key}/allLeaves"):
+            count(stats, "total")
+            process_episode(episode, show_folder, stats, cache, pipeline)
     except Exception as e:
-        logger.error(f"Error processing show '{show.get('title', 'Unknown')}': {e}")
-        stats["errors"] += 1
+        logger.error(f"Error processing show '{show.title}': {e}")
+        count(stats, "errors")
 
 
 def main():
@@ -322,14 +525,16 @@ def main():
 
     # Initialize overall stats for all libraries
     overall_stats = {"total": 0, "processed": 0, "skipped": 0, "errors": 0}
+    pipeline = ImagePipeline()
+    cache = None
 
     try:
         logger.info("Connecting to Plex server...")
         plex = PlexServer(PLEX_URL, PLEX_TOKEN, timeout=PLEX_TIMEOUT)
 
         logger.info("Building file cache...")
-        file_cache = build_file_cache(OUTPUT_FOLDER)
-        logger.info(f"File cache built with {len(file_cache)} files.")
+        cache = ArtworkCache(MANIFEST_FILE, OUTPUT_FOLDER)
+        logger.info(f"File cache built with {len(cache.existing)} files, {len(cache.entries)} in the manifest.")
 
         # Process libraries
         # Get libraries from .env or allow interactive mode
@@ -364,27 +569,25 @@ def main():
             logger.info(f"Processing library: {library_name}")
 
             if selected_library.type == "movie":
-                movies = selected_library.all()
+                movies = list(iter_library_items(selected_library.key, "movie"))
                 stats["total"] = len(movies)
                 choice = select_from_list(movies, "Select a movie to process (or 0 for all): ", include_all=True)
 
-                if choice == 0:
-                    for movie in movies:
-                        process_movie(movie, library_name, stats, file_cache)
-                else:
-                    selected_movie = movies[choice - 1]
-                    process_movie(selected_movie, library_name, stats, file_cache)
+                selected = movies if choice == 0 else [movies[choice - 1]]
+                for movie in selected:
+                    process_movie(movie, library_name, stats, cache, pipeline)
 
             elif selected_library.type == "show":
-                shows = selected_library.all()
+                shows = list(iter_library_items(selected_library.key, "show"))
                 choice = select_from_list(shows, "Select a TV show to process (or 0 for all): ", include_all=True)
 
                 if choice == 0:
-                    for show in shows:
-                        process_tv_show(show, library_name, stats, file_cache)
+                    process_library(selected_library, stats, cache, pipeline)  # One episode listing for all shows
                 else:
-                    selected_show = shows[choice - 1]
-                    process_tv_show(selected_show, library_name, stats, file_cache)
+                    stats["total"] = 1
+                    process_tv_show(shows[choice - 1], library_name, stats, cache, pipeline)
+
+            pipeline.wait()
 
             # Print library-specific stats
             print("\nProcessing Summary:")
@@ -400,11 +603,18 @@ def main():
 
         else:
             # Process libraries from .env
+            # Jobs from every library share the pipeline, so the next library is queued
+            # while the previous one is still downloading
             libraries_to_process = process_libraries(plex, libraries_from_env)
+            library_stats = []
             for library in libraries_to_process:
                 stats = {"total": 0, "processed": 0, "skipped": 0, "errors": 0}
-                process_library(library, stats, file_cache)
+                process_library(library, stats, cache, pipeline)
+                library_stats.append((library.title, stats))
+            pipeline.wait()
 
+            for library_name, stats in library_stats:
+                logger.info(f"Summary for '{library_name}': {stats}")
                 # Update overall stats
                 for key in overall_stats:
                     overall_stats[key] += stats[key]
@@ -424,11 +634,13 @@ def main():
         logger.critical(f"Critical error: {e}")
         print(f"Critical error: {e}")
     finally:
+        pipeline.shutdown()
+        if cache is not None:
+            cache.save()
         end_time = time.time()
         duration = end_time - start_time
         logger.info(f"Script completed in {duration:.2f} seconds.")
         print(f"Script completed in {duration:.2f} seconds.")
-        clean_up_old_logs()
         gc.collect()
 
 
@@ -13,7 +13,18 @@ from qbittorrentapi import Client, LoginFailed, APIConnectionError
 import yaml
 import argparse
 import json
-from pathlib import Path
+import re
+import hashlib
+import select
+import signal
+import sys
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pyprogs_logging import CONSOLE, setup_logging as setup_shared_logging  # noqa: E402
 
 # Load environment variables
 load_dotenv()
@@ -27,9 +38,45 @@ SHUTDOWN_FLAG = False
 # In powershell: "New-Item -ItemType File -Name mock.flg", "Remove-Item mock.flg"
 MOCK_FLAG_FILE = os.getenv("MOCK_FLAG_FILE", "mock.flg")  # Default: "mock.flg"
 LOG_EVERY_N_CHECKS = int(os.getenv("LOG_EVERY_N_CHECKS", 12))  # Default: 12
+MAINTENANCE_CHECK_INTERVAL = int(os.getenv("MAINTENANCE_CHECK_INTERVAL", 60))  # Default: 60 seconds
+BUTLER_REFRESH_TTL = int(os.getenv("BUTLER_REFRESH_TTL", 3600))  # Default: 3600 seconds
 LOG_DIVIDER = os.getenv("LOG_DIVIDER", "=") * 80  # Default: 80 equals
 TASK_DIVIDER = os.getenv("TASK_DIVIDER", "*") * 80  # Default: 80 asterisks
 MAX_LOGS = os.getenv("MAX_LOGS", "5")
+MAX_PARALLEL_TASKS = max(1, int(os.getenv("MAX_PARALLEL_TASKS", 1)))  # Default: 1 (run tasks one at a time)
+
+SERVICE_TIMEOUT = float(os.getenv("SERVICE_TIMEOUT", 10))  # Default: 10 seconds per *arr/download client call
+SERVICE_MAX_WORKERS = int(os.getenv("SERVICE_MAX_WORKERS", 8))  # Default: 8 calls at the same time
+
+STATS_FILE = "stats/task_stats.jsonl"
+LEGACY_STATS_FILE = "stats/task_stats.json"
+CHECKPOINT_FILE = "stats/checkpoint.json"
+ANOMALY_STATE_FILE = "stats/anomaly_state.json"
+ANOMALY_LOG_FILE = "logs/anomalies.jsonl"
+ANOMALY_ALPHA = float(os.getenv("ANOMALY_ALPHA", 0.1))  # Default: 0.1 (weight of the newest loop)
+ANOMALY_Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", 3.0))  # Default: 3 standard deviations
+ANOMALY_WARMUP = int(os.getenv("ANOMALY_WARMUP", 5))  # Default: 5 loops before flagging anything
+ANOMALY_MIN_DEVIATION = float(os.getenv("ANOMALY_MIN_DEVIATION", 60))  # Default: ignore deviations under 60s
+
+SUSPEND_BACKEND = os.getenv("SUSPEND_BACKEND", "auto")  # Default: auto (cgroup, then pgroup, then psutil)
+SUSPEND_SWEEPS = int(os.getenv("SUSPEND_SWEEPS", 3))  # Default: 3 passes to catch newly started children
+LOOP_TRIGGER = os.getenv("LOOP_TRIGGER", "always").lower()  # Default: always (fixed delay between loops)
+LOOP_DELAY = int(os.getenv("LOOP_DELAY", 60))  # Default: 60 seconds
+LOOP_MAX_DELAY = int(os.getenv("LOOP_MAX_DELAY", 3600))  # Default: check for changes at least hourly
+LOOP_MAX_IDLE = int(os.getenv("LOOP_MAX_IDLE", 86400))  # Default: run at least once a day
+LOOP_WATCH_PATHS = [path for path in os.getenv("LOOP_WATCH_PATHS", "").split(";") if path]  # Default: none
+RESOURCE_SAMPLE_INTERVAL = max(1, int(os.getenv("RESOURCE_SAMPLE_INTERVAL", 30)))  # Default: 30 seconds, at least 1
+EXIT_POLL_INTERVAL = int(os.getenv("EXIT_POLL_INTERVAL", 5))  # Default: 5 seconds (only without pidfd/kqueue)
+RESOURCE_LIMIT_KEYS = ("nice", "ionice", "cpu_affinity", "memory_limit")
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))  # Default: 0 (no HTTP metrics endpoint)
+METRICS_TEXTFILE = os.getenv("METRICS_TEXTFILE")  # Default: unset (no textfile exporter)
+METRICS_TEXTFILE_INTERVAL = int(os.getenv("METRICS_TEXTFILE_INTERVAL", 15))  # Default: 15 seconds
+TASK_LOG_DIR = os.getenv("TASK_LOG_DIR", os.path.join("logs", "tasks"))  # Default: logs/tasks
+TASK_LOG_MAX_BYTES = int(os.getenv("TASK_LOG_MAX_BYTES", 10 * 1024 * 1024))  # Default: 10 MB per file
+TASK_LOG_BACKUPS = int(os.getenv("TASK_LOG_BACKUPS", 3))  # Default: 3 rotated files per task
+TASK_OUTPUT_TAIL_LINES = int(os.getenv("TASK_OUTPUT_TAIL_LINES", 50))  # Default: last 50 lines kept
+TASK_OUTPUT_ECHO = os.getenv("TASK_OUTPUT_ECHO", "false").lower() in ("1", "true", "yes")  # Default: false
+TASK_OUTPUT_MAX_LINE = int(os.getenv("TASK_OUTPUT_MAX_LINE", 65536))  # Default: 64 KB, longer lines are split
 
 # Get .env configuration
 PLEX_URL = os.getenv("PLEX_URL")
@@ -52,31 +99,43 @@ NZBGET_PASSWORD = os.getenv("NZBGET_PASSWORD", "tegbzn6789")
 
 # === Helper Functions ===
 
-def execute_task(task, start, end, loop_count=None, current_task_idx=None, total_tasks=None, loop_start_mon=None):
-    """Execute a task and return its duration and maintenance time."""
-    log_and_print(f"Executing task: {task.get('description')}", "info")
+def execute_task(task, window, loop_count=None, current_task_idx=None, total_tasks=None, loop_start_mon=None):
+    """
+    Execute a task and return its duration, maintenance time and a dict with its resource usage,
+    exit code and, if it failed, the last lines of its output (empty for action tasks).
+    """
+    description = task.get("description")
+    log_and_print(f"Executing task: {description}", "info")
+    METRICS.task_started(description)
+    task_duration, maintenance_time = 0, 0  # Fallback values
+    usage = {}
     try:
         if "script_path" in task:  # For script-based tasks
-            return run_script_with_context(
+            task_duration, maintenance_time = run_script_with_context(
                 task["script_path"],
                 task["args"],
-                start,
-                end,
+                window,
                 use_venv=task.get("use_venv"),
                 loop_count=loop_count,
                 current_task_idx=current_task_idx,
                 total_tasks=total_tasks,
                 loop_start_mon=loop_start_mon,
+                description=description,
+                limits={key: task[key] for key in RESOURCE_LIMIT_KEYS if task.get(key) is not None},
+                usage=usage,
             )
 
         elif "action" in task:  # For Python function-based tasks
             action_function = globals().get(task["action"])
             if not action_function:
                 raise ValueError(f"Unknown action: {task['action']}")
-            return ensure_return_value(action_function)
+            task_duration, maintenance_time = ensure_return_value(action_function)
     except Exception as e:
-        log_and_print(f"Error executing task '{task.get('description')}': {e}", "error")
-        return 0, 0  # Return fallback values
+        log_and_print(f"Error executing task '{description}': {e}", "error")
+        usage["error"] = str(e)
+    finally:
+        METRICS.task_finished(description, task_duration, maintenance_time)
+    return task_duration, maintenance_time, usage
 
 
 def ensure_return_value(func, *args, **kwargs):
@@ -89,48 +148,12 @@ def ensure_return_value(func, *args, **kwargs):
 
 def setup_logging(max_logs=5):
     """
-    Configure logging to rotate logs with a timestamp in the 'logs/' directory.
+    Configure logging to logs/orchestrator.log through the shared background log writer.
+    Messages from log_and_print are also echoed to the console.
     """
-    max_logs = int(max_logs)
-
-    # Ensure logs directory exists
-    log_dir = "logs"
-    os.makedirs(log_dir, exist_ok=True)
-
-    # Get the current script name without extension
     script_name = os.path.splitext(os.path.basename(__file__))[0]
-    current_log_file = os.path.join(log_dir, f"{script_name}.log")
-
-    # Generate a timestamp for the rotated log
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    rotated_log_file = os.path.join(log_dir, f"{script_name}_{timestamp}.log")
-
-    # Rotate the log file if it exists
-    if os.path.exists(current_log_file):
-        os.rename(current_log_file, rotated_log_file)
-
-    # Limit the number of log files to max_logs
-    log_files = sorted(
-        [
-            os.path.join(log_dir, f)
-            for f in os.listdir(log_dir)
-            if f.startswith(script_name) and f.endswith(".log")
-        ],
-        key=os.path.getmtime,
-    )
-
-    while len(log_files) > max_logs - 1:  # Keep max_logs - 1 old logs + 1 current log
-        os.remove(log_files.pop(0))
-
-    # Set up logging
-    logging.basicConfig(
-        filename=current_log_file,
-        level=logging.INFO,
-        format="%(asctime)s - %(levelname)s - %(message)s",
-    )
-
-    logging.info("Rotated log file to %s", rotated_log_file)
-    logging.info("Logging started in %s", current_log_file)
+    log_file = setup_shared_logging(script_name, max_log_files=max_logs, console="flagged")
+    logging.info("Logging started in %s", log_file)
 
 
 def format_time(seconds):
@@ -187,10 +210,9 @@ def log_and_continue(action_name, func, *args, **kwargs):
 
 def log_and_print(message, level="info"):
     """
-    Log and print a message to the console.
+    Log a message and echo it to the console. Both are written by the background log thread.
     """
-    getattr(logging, level)(message)  # Log the message
-    print(message)  # Print to the console
+    logging.getLogger().log(getattr(logging, level.upper()), message, extra=CONSOLE)
 
 
 def log_process_tree_with_delay(parent_pid, delay=2.0):
@@ -208,13 +230,92 @@ def log_process_tree_with_delay(parent_pid, delay=2.0):
         log_and_print(f"Parent process {parent_pid} no longer exists.", "warning")
 
 
-def run_task_with_pause_check(command, start, end, loop_count=None, current_task_idx=None, total_tasks=None, loop_start_mon=None):
+def next_maintenance_check(window):
+    """
+    Seconds to wait before checking the maintenance window again: at the next window edge,
+    but never longer than MAINTENANCE_CHECK_INTERVAL so the mock flag is still picked up.
+    """
+    until_change = window.seconds_until_change()
+    if until_change is None:
+        return MAINTENANCE_CHECK_INTERVAL
+    return max(1, min(MAINTENANCE_CHECK_INTERVAL, until_change))
+
+
+def has_exited(process):
+    """Return True if the process has exited, without reaping it on POSIX."""
+    if process.returncode is not None:
+        return True
+    if os.name == "nt" or not hasattr(os, "waitid"):
+        return process.poll() is not None
+    try:
+        return os.waitid(os.P_PID, process.pid, os.WEXITED | os.WNOHANG | os.WNOWAIT) is not None
+    except ChildProcessError:
+        return process.poll() is not None
+
+
+def wait_for_exit(process, timeout):
+    """
+    Block until the process exits or `timeout` seconds pass.
+    Uses a pidfd on Linux, kqueue on macOS/BSD and WaitForSingleObject (Popen.wait) on Windows,
+    which all sleep in the kernel until the exit. Other platforms check every EXIT_POLL_INTERVAL seconds.
+    Returns True if the process has exited. On POSIX the exited process is left unreaped, so its
+    final resource usage can still be read (see ProcessTreeMonitor); Popen reaps it on the next poll().
+    """
+    if has_exited(process):
+        return True
+
+    if hasattr(os, "pidfd_open"):
+        try:
+            pidfd = os.pidfd_open(process.pid)
+        except OSError:
+            pidfd = None
+        if pidfd is not None:
+            try:
+                select.select([pidfd], [], [], timeout)
+            finally:
+                os.close(pidfd)
+            return has_exited(process)
+
+    if hasattr(select, "kqueue"):
+        kq = select.kqueue()
+        try:
+            event = select.kevent(process.pid, filter=select.KQ_FILTER_PROC,
+                                  flags=select.KQ_EV_ADD | select.KQ_EV_ONESHOT, fflags=select.KQ_NOTE_EXIT)
+            kq.control([event], 1, timeout)
+        except ProcessLookupError:
+            pass  # Exited before the event was registered
+        finally:
+            kq.close()
+        return has_exited(process)
+
+    if os.name == "nt":
+        # Popen.wait blocks in WaitForSingleObject on Windows; on POSIX it would busy-poll
+        try:
+            process.wait(timeout=timeout)
+            return True
+        except subprocess.TimeoutExpired:
+            return False
+
+    deadline = time.monotonic() + timeout
+    while not has_exited(process):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(EXIT_POLL_INTERVAL, remaining))
+    return True
+
+
+def run_task_with_pause_check(command, window, loop_count=None, current_task_idx=None, total_tasks=None,
+                              loop_start_mon=None, cwd=None, description=None, limits=None, usage=None):
     # Set default values if None
     loop_count = loop_count or "?"
     current_task_idx = current_task_idx or "?"
     total_tasks = total_tasks or "?"
     task_start_mon = time.monotonic()
-    run_task_with_pause_check._tick = 0
+    # "Task still running" is logged every LOG_EVERY_N_CHECKS maintenance checks' worth of time,
+    # however often the loop below wakes up
+    heartbeat_interval = LOG_EVERY_N_CHECKS * MAINTENANCE_CHECK_INTERVAL
+    last_heartbeat_mon = task_start_mon
 
     log_and_print(TASK_DIVIDER, "info")
     loop_elapsed = elapsed_str(loop_start_mon) if loop_start_mon else "??:??:??"
@@ -227,17 +328,25 @@ def run_task_with_pause_check(command, start, end, loop_count=None, current_task
         "info"
     )
 
-    process = subprocess.Popen(command)
+    output = TaskOutputCapture(description)
+    process = subprocess.Popen(command, cwd=cwd, **get_suspender().popen_kwargs(), **output.popen_kwargs())
+    output.start(process)
+    log_and_print(f"{task_info}: Task output is written to {output.log_file}", "info")
+    get_suspender().attach(process.pid)
     RUNNING_PROCESSES.add(process.pid)
     PAUSED_PROCESSES.discard(process.pid)
+    METRICS.task_process(description, process.pid)
+    monitor = ProcessTreeMonitor(process.pid, limits, task_info)
     maintenance_time = 0
     task_start_time = time.time()
 
     try:
         log_process_tree_with_delay(process.pid, delay=0.1)
+        if monitor.sample() is False:
+            monitor.terminate_tree()
 
         while process.poll() is None:
-            if is_maintenance_time(start, end, loop_count, current_task_idx, total_tasks):
+            if is_maintenance_time(window, loop_count, current_task_idx, total_tasks):
                 loop_elapsed = elapsed_str(loop_start_mon) if loop_start_mon else "??:??:??"
                 task_elapsed = elapsed_str(task_start_mon)
 
@@ -248,8 +357,9 @@ def run_task_with_pause_check(command, start, end, loop_count=None, current_task
                     )
                 pause_start = time.time()
                 pause_process(process.pid)
+                METRICS.task_paused(description, True)
 
-                while is_maintenance_time(start, end, loop_count, current_task_idx, total_tasks):
+                while is_maintenance_time(window, loop_count, current_task_idx, total_tasks):
                     loop_elapsed = elapsed_str(loop_start_mon) if loop_start_mon else "??:??:??"
                     task_elapsed = elapsed_str(task_start_mon)
 
@@ -258,17 +368,16 @@ def run_task_with_pause_check(command, start, end, loop_count=None, current_task
                         f"Still within the maintenance window. Waiting...",
                         "info"
                     )
-                    time.sleep(10)
+                    wait_for_exit(process, next_maintenance_check(window))
 
                 pause_end = time.time()
                 maintenance_time += pause_end - pause_start
                 log_and_print(f"{task_info}: Maintenance ended. Resuming task...", "info")
                 resume_process(process.pid)
+                METRICS.task_paused(description, False)
 
-            run_task_with_pause_check._tick += 1
-
-            if run_task_with_pause_check._tick >= LOG_EVERY_N_CHECKS:
-                run_task_with_pause_check._tick = 0
+            if time.monotonic() - last_heartbeat_mon >= heartbeat_interval:
+                last_heartbeat_mon = time.monotonic()
                 loop_elapsed = elapsed_str(loop_start_mon) if loop_start_mon else "??:??:??"
                 task_elapsed = elapsed_str(task_start_mon)
                 log_and_print(
@@ -277,16 +386,16 @@ def run_task_with_pause_check(command, start, end, loop_count=None, current_task
                     "info"
                 )
 
-            time.sleep(5)
+            # Wake up as soon as the task exits, when the maintenance window may have changed,
+            # or when it's time to sample the process tree again
+            wait_for_exit(process, min(next_maintenance_check(window), RESOURCE_SAMPLE_INTERVAL))
+            # Sample before poll() reaps the task, so an exited task's final CPU and I/O are still readable
+            if monitor.sample() is False and process.poll() is None:
+                monitor.terminate_tree()
 
-    except KeyboardInterrupt:
-        log_and_print("Ctrl-C detected. Terminating subprocess...", "warning")
-        process.terminate()
-        process.wait()
-        raise  # Re-raise to propagate exit signal
     except Exception as e:
         log_and_print(f"Error during task execution: {e}", "error")
-        process.terminate()
+        get_suspender().terminate(process.pid)
         process.wait()
         return 0, maintenance_time  # Provide fallback values
 
@@ -297,6 +406,19 @@ def run_task_with_pause_check(command, start, end, loop_count=None, current_task
         if process.poll() is None:
             process.terminate()
             process.wait()
+        METRICS.task_exit_code(description, process.returncode)
+        get_suspender().detach(process.pid)
+        output.close(process.returncode)
+        if usage is not None:
+            usage.update(monitor.usage())
+            usage["exit_code"] = process.returncode
+            if process.returncode != 0:
+                usage["stdout_tail"] = output.tail("stdout")
+                usage["stderr_tail"] = output.tail("stderr")
+        if process.returncode != 0:
+            last_lines = output.tail("stderr")[-10:] or output.tail("stdout")[-10:]
+            log_and_print(f"{task_info}: Task exited with code {process.returncode}. See {output.log_file}"
+                          + "".join(f"\n  {line}" for line in last_lines), "warning")
 
     # Calculate task duration excluding maintenance time
     task_end_time = time.time()
@@ -306,11 +428,287 @@ def run_task_with_pause_check(command, start, end, loop_count=None, current_task
     log_and_print(f"Total time: {format_time(task_duration)}", "info")
     log_and_print(f"Active task time (excluding maintenance): {format_time(task_duration - maintenance_time)}", "info")
     log_and_print(f"Total maintenance time: {format_time(maintenance_time)}", "info")
+    log_and_print(f"Resource usage: {format_usage(monitor.usage())}", "info")
     # log_and_print(f"Returning values: Task Duration: {task_duration}, Maintenance Time: {maintenance_time}", "info")
 
     return task_duration, maintenance_time
 
 
+def parse_size(value):
+    """Convert a size like 512, '512M' or '2G' to bytes."""
+    if isinstance(value, int):
+        return value
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+    value = str(value).strip().upper().rstrip("B")
+    if value and value[-1] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+def format_usage(usage):
+    """Format a resource usage dict for the log."""
+    if not usage:
+        return "n/a"
+    return (f"Peak RSS {usage['peak_rss_bytes'] / 1024 ** 2:.0f} MB, "
+            f"CPU {format_time(usage['cpu_seconds'])}, "
+            f"I/O {usage['io_bytes'] / 1024 ** 2:.0f} MB")
+
+
+def to_os_priority(nice):
+    """Map a Unix nice value to a Windows priority class where needed."""
+    if not psutil.WINDOWS:
+        return nice
+    if nice >= 15:
+        return psutil.IDLE_PRIORITY_CLASS
+    if nice > 0:
+        return psutil.BELOW_NORMAL_PRIORITY_CLASS
+    if nice < 0:
+        return psutil.ABOVE_NORMAL_PRIORITY_CLASS
+    return psutil.NORMAL_PRIORITY_CLASS
+
+
+def to_os_ionice(level):
+    """Map 'idle', 'low' or 'normal' to psutil.Process.ionice() arguments for this OS."""
+    if psutil.WINDOWS:
+        return ({"idle": psutil.IOPRIO_VERYLOW, "low": psutil.IOPRIO_LOW, "normal": psutil.IOPRIO_NORMAL}[level],)
+    if level == "idle":
+        return (psutil.IOPRIO_CLASS_IDLE,)
+    return (psutil.IOPRIO_CLASS_BE, 7 if level == "low" else 4)
+
+
+LINE_BREAK = re.compile(rb"\r\n|\r|\n")
+
+
+class TaskOutputCapture:
+    """
+    Drain a task's stdout and stderr on reader threads so the pipes never fill up and stall the child.
+    Lines go to a rotating per-task log file under TASK_LOG_DIR, and the last few lines of each stream
+    are kept in memory so they can be attached to the loop stats when the task fails.
+    """
+
+    def __init__(self, description, tail_lines=TASK_OUTPUT_TAIL_LINES, echo=TASK_OUTPUT_ECHO):
+        self.description = description or "task"
+        self.echo = echo
+        self.tails = {"stdout": deque(maxlen=max(1, tail_lines)), "stderr": deque(maxlen=max(1, tail_lines))}
+        self._threads = []
+        self._lock = threading.Lock()
+
+        os.makedirs(TASK_LOG_DIR, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9._-]+", "_", self.description).strip("_") or "task"
+        self.log_file = os.path.join(TASK_LOG_DIR, f"{slug}.log")
+        self._file = open(self.log_file, "a", encoding="utf-8")
+        self._size = self._file.tell()
+        self._stamp_second, self._stamp = None, ""
+
+    def popen_kwargs(self):
+        return {"stdout": subprocess.PIPE, "stderr": subprocess.PIPE}
+
+    def start(self, process):
+        self._write("orchestrator", f"Starting: {' '.join(process.args)}")
+        for stream, pipe in (("stdout", process.stdout), ("stderr", process.stderr)):
+            thread = threading.Thread(target=self._read, args=(stream, pipe), daemon=True,
+                                      name=f"{self.description}-{stream}")
+            thread.start()
+            self._threads.append(thread)
+
+    def _read(self, stream, pipe):
+        """
+        Read whatever is available in large chunks; going line by line is too slow for chatty tasks.
+        Lines end at \n, \r\n or a lone \r (progress bars redraw with \r and never print \n), and
+        anything over TASK_OUTPUT_MAX_LINE bytes without a line break is written out as a line, so the
+        buffer stays small and the output shows up in the log while the task runs.
+        """
+        tail = self.tails[stream]
+        pending = bytearray()
+        after_cr = False
+        with pipe:
+            while True:
+                chunk = pipe.read1(65536)
+                if not chunk:
+                    break
+                if after_cr and chunk.startswith(b"\n"):
+                    chunk = chunk[1:]  # The \n of a \r\n that was split over two reads
+                after_cr = chunk.endswith(b"\r")
+                last_break = max(chunk.rfind(b"\n"), chunk.rfind(b"\r"))
+                if last_break >= 0:
+                    pending += chunk[:last_break + 1]
+                    lines = LINE_BREAK.split(pending)[:-1]
+                    if len(pending) > TASK_OUTPUT_MAX_LINE:
+                        lines = [line[i:i + TASK_OUTPUT_MAX_LINE] for line in lines
+                                 for i in range(0, max(len(line), 1), TASK_OUTPUT_MAX_LINE)]
+                    self._write_lines(stream, tail, lines)
+                    pending = bytearray(chunk[last_break + 1:])
+                else:
+                    pending += chunk
+                while len(pending) >= TASK_OUTPUT_MAX_LINE:
+                    self._write_lines(stream, tail, [pending[:TASK_OUTPUT_MAX_LINE]])
+                    del pending[:TASK_OUTPUT_MAX_LINE]
+            if pending:
+                self._write_lines(stream, tail, [pending])
+
+    def _write_lines(self, stream, tail, raw_lines):
+        lines = [raw.decode("utf-8", errors="replace").rstrip("\r") for raw in raw_lines]
+        tail.extend(lines)
+        if self.echo:
+            print("".join(f"[{self.description}] {line}\n" for line in lines), end="", flush=True)
+        now = int(time.time())
+        if now != self._stamp_second:
+            self._stamp_second, self._stamp = now, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))
+        prefix = f"{self._stamp} - {stream} - "
+        text = "".join(f"{prefix}{line}\n" for line in lines)
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(text)
+            self._file.flush()  # One flush per batch read from the pipe, so the log can be followed live
+            self._size += len(text)
+            if self._size >= TASK_LOG_MAX_BYTES:
+                self._rotate()
+
+    def _write(self, stream, line):
+        self._write_lines(stream, deque(), [line.encode("utf-8")])
+
+    def _rotate(self):
+        """Roll the log over like RotatingFileHandler: task.log -> task.log.1 -> ... -> task.log.N."""
+        self._file.close()
+        if TASK_LOG_BACKUPS > 0:
+            for i in range(TASK_LOG_BACKUPS - 1, 0, -1):
+                if os.path.exists(f"{self.log_file}.{i}"):
+                    os.replace(f"{self.log_file}.{i}", f"{self.log_file}.{i + 1}")
+            os.replace(self.log_file, f"{self.log_file}.1")
+            self._file = open(self.log_file, "a", encoding="utf-8")
+        else:
+            self._file = open(self.log_file, "w", encoding="utf-8")
+        self._size = 0
+
+    def tail(self, stream="stdout"):
+        return list(self.tails[stream])
+
+    def close(self, returncode=None, timeout=5):
+        """
+        Wait for the readers to finish and close the log file. Grandchildren that inherited the pipes
+        can keep them open, so the wait is bounded; anything they write after that is dropped.
+        """
+        for thread in self._threads:
+            thread.join(timeout)
+        self._write("orchestrator", f"Exited with code {returncode}")
+        with self._lock:
+            self._file.close()
+            self._file = None
+
+
+class ProcessTreeMonitor:
+    """
+    Apply a task's resource limits (nice, ionice, cpu_affinity) to every process in its tree
+    and keep track of what the tree uses. Children are picked up each time the tree is sampled.
+    """
+
+    def __init__(self, pid, limits=None, task_info=""):
+        self.pid = pid
+        self.limits = limits or {}
+        self.task_info = task_info
+        self.memory_limit = parse_size(self.limits["memory_limit"]) if "memory_limit" in self.limits else None
+        self.peak_rss = 0
+        self._limited = set()
+        self._live = {}  # pid -> (parent pid, CPU seconds, I/O bytes) at the last sample
+        self._gone_cpu_seconds = 0.0
+        self._gone_io_bytes = 0
+        self._warned = set()
+
+    def _apply_limits(self, process):
+        settings = [
+            ("nice", lambda value: process.nice(to_os_priority(value))),
+            ("ionice", lambda value: process.ionice(*to_os_ionice(value))),
+            ("cpu_affinity", lambda value: process.cpu_affinity(value)),
+        ]
+        for key, apply in settings:
+            if key not in self.limits:
+                continue
+            try:
+                apply(self.limits[key])
+            except (psutil.NoSuchProcess, psutil.ZombieProcess):
+                return
+            except (psutil.AccessDenied, AttributeError, ValueError, OSError) as e:
+                if key not in self._warned:  # Only warn once per setting
+                    self._warned.add(key)
+                    log_and_print(f"{self.task_info}: Could not apply {key}={self.limits[key]}: {e}", "warning")
+
+    def sample(self):
+        """
+        Apply limits to new processes in the tree and record their usage.
+        Returns the tree's current RSS, or False if it is over the task's memory limit.
+        """
+        try:
+            processes = [psutil.Process(self.pid)] + get_child_processes(self.pid)
+        except psutil.NoSuchProcess:
+            return 0
+
+        rss = 0
+        live = {}
+        for process in processes:
+            try:
+                with process.oneshot():
+                    if process.pid not in self._limited:
+                        self._limited.add(process.pid)
+                        self._apply_limits(process)
+                    # children_* holds what the process's reaped children used (0 where not supported)
+                    cpu = process.cpu_times()
+                    cpu_seconds = cpu.user + cpu.system + getattr(cpu, "children_user", 0) + \
+                        getattr(cpu, "children_system", 0)
+                    io_bytes = 0
+                    if hasattr(process, "io_counters"):
+                        io = process.io_counters()
+                        io_bytes = io.read_bytes + io.write_bytes
+                    live[process.pid] = (process.ppid(), cpu_seconds, io_bytes)
+                    rss += process.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        for pid, (parent_pid, cpu_seconds, io_bytes) in self._live.items():
+            if pid in live:
+                continue
+            # On Linux a process reaped by its parent is added to the parent's children_* CPU times and
+            # I/O counters, so it is already counted if the parent is still in the tree
+            if not (psutil.LINUX and parent_pid in live):
+                self._gone_cpu_seconds += cpu_seconds
+                self._gone_io_bytes += io_bytes
+        self._live = live
+        self.peak_rss = max(self.peak_rss, rss)
+
+        if self.memory_limit and rss > self.memory_limit:
+            log_and_print(
+                f"{self.task_info}: Task is using {rss / 1024 ** 2:.0f} MB, over its memory_limit of "
+                f"{self.memory_limit / 1024 ** 2:.0f} MB. Terminating it.",
+                "error"
+            )
+            return False
+        return rss
+
+    def terminate_tree(self):
+        """Terminate the task's children first, then the task itself."""
+        for child in reversed(get_child_processes(self.pid)):
+            try:
+                child.terminate()
+            except psutil.NoSuchProcess:
+                pass
+        try:
+            psutil.Process(self.pid).terminate()
+        except psutil.NoSuchProcess:
+            pass
+
+    def usage(self):
+        """
+        Resource usage of the tree so far. On Linux each sample includes what the tree's processes
+        got back from reaping their children, so short-lived children (e.g. magick started by pwsh)
+        are counted even if they never show up in a sample, and the task's final sample is taken
+        just after it exits. Elsewhere CPU and I/O are the last sampled values of each process.
+        """
+        return {
+            "peak_rss_bytes": self.peak_rss,
+            "cpu_seconds": round(self._gone_cpu_seconds + sum(cpu for _, cpu, _ in self._live.values()), 3),
+            "io_bytes": self._gone_io_bytes + sum(io for _, _, io in self._live.values()),
+        }
+
+
 def get_plex_maintenance_window():
     """Get Plex's built-in maintenance window (Butler settings)."""
     if not plex:
@@ -330,49 +728,115 @@ def get_plex_maintenance_window():
         return None, None
 
 
-def is_mock_maintenance_enabled():
+class MockFlag:
     """
-    Check for the presence of the mock flag file (case-insensitive) in the orchestrator's directory
-    and dynamically adjust the mock maintenance period.
+    Watch for the mock flag file (case-insensitive) in the orchestrator's directory.
+    The directory is only re-listed when its mtime changes, so each check is a single stat.
     """
-    now = datetime.now()
-    script_dir = os.path.dirname(os.path.abspath(__file__))  # Directory where orchestrator.py is located
 
-    # Check for the presence of mock.flg case-insensitively in the script directory
-    for file in os.listdir(script_dir):
-        if file.lower() == MOCK_FLAG_FILE.lower():
-            # Set the maintenance window to extend dynamically
-            start_time = now
-            end_time = now + timedelta(seconds=120)  # Extend by 120 seconds each check
-            # log_and_print(f"Mock maintenance active. Window: {start_time.time()} to {end_time.time()}", "info")
-            return start_time, end_time
+    def __init__(self, flag_name=MOCK_FLAG_FILE, directory=None):
+        self.flag_name = flag_name.lower()
+        self.directory = directory or os.path.dirname(os.path.abspath(__file__))
+        self._dir_mtime = None
+        self._present = False
+
+    def is_present(self):
+        try:
+            dir_mtime = os.stat(self.directory).st_mtime_ns
+        except OSError:
+            return False
+        if dir_mtime != self._dir_mtime:
+            self._dir_mtime = dir_mtime
+            self._present = any(file.lower() == self.flag_name for file in os.listdir(self.directory))
+        return self._present
+
+
+MOCK_FLAG = MockFlag()
 
-    # log_and_print("Mock maintenance not active.", "info")
-    return None, None
 
+class MaintenanceWindow:
+    """
+    Plex's daily maintenance window, parsed once from the Butler settings.
+    Handles windows that cross midnight (e.g. 23:00 to 02:00) and re-reads the
+    Butler settings from Plex at most once every BUTLER_REFRESH_TTL seconds.
+    A window that starts and ends at the same time is empty: tasks are never paused for it.
+    """
 
-def is_maintenance_time(start, end, loop_count=None, current_task_idx=None, total_tasks=None):
-    now = datetime.now()
+    def __init__(self, start=None, end=None, ttl=BUTLER_REFRESH_TTL, mock_flag=MOCK_FLAG):
+        self.ttl = ttl
+        self.mock_flag = mock_flag
+        self._refreshed_at = None
+        self._set(start, end)
+
+    def _set(self, start, end):
+        changed = (start, end) != (getattr(self, "start", None), getattr(self, "end", None))
+        self.start, self.end = start, end
+        try:
+            self._start = datetime.strptime(start, "%H:%M").time()
+            self._end = datetime.strptime(end, "%H:%M").time()
+        except (TypeError, ValueError):
+            self._start = self._end = None
+        if changed and self._start is not None and self._start == self._end:
+            log_and_print(f"Maintenance window starts and ends at {start}; treating it as empty, "
+                          f"tasks won't be paused for Plex maintenance.", "warning")
+
+    def refresh(self, force=False):
+        """Re-read the Butler settings from Plex if the cached ones are older than the TTL."""
+        now = time.monotonic()
+        if not force and self._refreshed_at is not None and now - self._refreshed_at < self.ttl:
+            return
+        start, end = get_plex_maintenance_window()
+        self._refreshed_at = now
+        if start and end:
+            self._set(start, end)
+
+    def status(self, now=None):
+        """Return 'mock_maintenance', 'real_maintenance', 'no_maintenance' or None if the window is unknown."""
+        if self.mock_flag and self.mock_flag.is_present():
+            return "mock_maintenance"
+        if self._start is None:
+            return None
+        if self._start == self._end:
+            return "no_maintenance"
+        now_time = (now or datetime.now()).time()
+        if self._start < self._end:
+            in_maintenance = self._start <= now_time < self._end
+        else:  # Window crosses midnight
+            in_maintenance = now_time >= self._start or now_time < self._end
+        return "real_maintenance" if in_maintenance else "no_maintenance"
+
+    def seconds_until_change(self, now=None):
+        """
+        Seconds until the window next opens or closes, or None when that can't be known
+        in advance (mock maintenance, or no or an empty window).
+        """
+        if self.mock_flag and self.mock_flag.is_present():
+            return None
+        if self._start is None or self._start == self._end:
+            return None
+        now = now or datetime.now()
+        edges = []
+        for edge_time in (self._start, self._end):
+            edge = datetime.combine(now.date(), edge_time)
+            if edge <= now:
+                edge += timedelta(days=1)
+            edges.append((edge - now).total_seconds())
+        return min(edges)
+
+
+def is_maintenance_time(window, loop_count=None, current_task_idx=None, total_tasks=None):
     loop_count = loop_count or "?"
     current_task_idx = current_task_idx or "?"
     total_tasks = total_tasks or "?"
 
     task_info = f"Loop {loop_count} - Task {current_task_idx} / {total_tasks}"
 
-    mock_start, mock_end = is_mock_maintenance_enabled()
-    if mock_start and mock_end:
-        in_maintenance = mock_start <= now <= mock_end
-        current_status = "mock_maintenance" if in_maintenance else "no_maintenance"
-    else:
-        try:
-            now_time = now.time()
-            start_time = datetime.strptime(start, "%H:%M").time()
-            end_time = datetime.strptime(end, "%H:%M").time()
-            in_maintenance = start_time <= now_time <= end_time
-            current_status = "real_maintenance" if in_maintenance else "no_maintenance"
-        except Exception as e:
-            log_and_print(f"{task_info}: Error checking maintenance time: {e}", "error")
-            return False
+    window.refresh()
+    current_status = window.status()
+    if current_status is None:
+        log_and_print(f"{task_info}: Error checking maintenance time: no valid maintenance window.", "error")
+        return False
+    in_maintenance = current_status != "no_maintenance"
 
     # Log status changes
     if not hasattr(is_maintenance_time, "_state"):
@@ -399,262 +863,645 @@ def get_child_processes(parent_pid):
         return []
 
 
+def wait_for_processes(processes, timeout):
+    """
+    Wait up to `timeout` seconds for the processes to exit and return the ones still alive.
+    Zombies count as exited, so the task's own Popen can still reap its process and get the exit code.
+    """
+    def is_alive(process):
+        try:
+            return process.is_running() and process.status() != psutil.STATUS_ZOMBIE
+        except psutil.NoSuchProcess:
+            return False
+
+    deadline = time.monotonic() + timeout
+    alive = [process for process in processes if is_alive(process)]
+    while alive and time.monotonic() < deadline:
+        time.sleep(0.1)
+        alive = [process for process in alive if is_alive(process)]
+    return alive
+
+
+class PsutilSweepBackend:
+    """
+    Suspend a process tree one process at a time with psutil, parent first so it can't start
+    new children, then sweep the tree again until no unsuspended process is left.
+    Works everywhere psutil does (including Windows).
+    """
+
+    name = "psutil"
+
+    def __init__(self):
+        self._suspended = {}  # root pid -> set of suspended pids
+
+    def popen_kwargs(self):
+        return {}
+
+    def attach(self, pid):
+        pass
+
+    def detach(self, pid):
+        self._suspended.pop(pid, None)
+
+    def _tree(self, pid):
+        try:
+            return [psutil.Process(pid)] + get_child_processes(pid)
+        except psutil.NoSuchProcess:
+            return []
+
+    def _sweep(self, pid, suspended):
+        for _ in range(SUSPEND_SWEEPS):
+            found_new = False
+            for process in self._tree(pid):
+                if process.pid in suspended:
+                    continue
+                try:
+                    process.suspend()
+                    suspended.add(process.pid)
+                    found_new = True
+                except psutil.NoSuchProcess:
+                    continue
+            if not found_new:
+                break
+
+    def freeze(self, pid):
+        """Suspend the tree under pid and return the suspended pids."""
+        suspended = self._suspended.setdefault(pid, set())
+        self._sweep(pid, suspended)
+        return sorted(suspended)
+
+    def thaw(self, pid):
+        """Resume the tree under pid and return the resumed pids."""
+        suspended = self._suspended.pop(pid, set())
+        # Children before the parent, so the parent never sees a half-resumed tree
+        for process in reversed(self._tree(pid)):
+            try:
+                process.resume()
+                suspended.add(process.pid)
+            except psutil.NoSuchProcess:
+                continue
+        return sorted(suspended)
+
+    def thaw_all(self):
+        for pid in list(self._suspended):
+            self.thaw(pid)
+
+    def terminate(self, pid, timeout=5):
+        """Terminate the tree under pid, then kill whatever is still running after `timeout` seconds."""
+        processes = self._tree(pid)
+        for process in processes:
+            try:
+                process.terminate()
+            except psutil.NoSuchProcess:
+                continue
+        for process in wait_for_processes(processes, timeout):
+            try:
+                process.kill()
+            except psutil.NoSuchProcess:
+                continue
+
+
+class ProcessGroupBackend(PsutilSweepBackend):
+    """
+    Start each task in its own process group and stop the whole group with one SIGSTOP,
+    then sweep for processes that left the group (e.g. via setsid). POSIX only.
+    """
+
+    name = "pgroup"
+
+    def __init__(self):
+        super().__init__()
+        self._pgids = {}  # root pid -> process group id
+
+    def popen_kwargs(self):
+        return {"start_new_session": True}
+
+    def attach(self, pid):
+        try:
+            self._pgids[pid] = os.getpgid(pid)
+        except ProcessLookupError:
+            pass
+
+    def detach(self, pid):
+        self._pgids.pop(pid, None)
+        super().detach(pid)
+
+    def _group(self, pgid):
+        members = []
+        for process in psutil.process_iter():
+            try:
+                if os.getpgid(process.pid) == pgid:
+                    members.append(process)
+            except (ProcessLookupError, psutil.NoSuchProcess):
+                continue
+        return members
+
+    def terminate(self, pid, timeout=5):
+        """
+        Send SIGTERM to the task's whole process group, then SIGKILL after `timeout` seconds.
+        The group is in its own session, so Ctrl-C in the terminal never reaches it; without
+        this, grandchildren (e.g. pwsh -> magick) would outlive the orchestrator.
+        """
+        pgid = self._pgids.get(pid)
+        if pgid is None:
+            return super().terminate(pid, timeout)
+        processes = list({process.pid: process for process in self._tree(pid) + self._group(pgid)}.values())
+        try:
+            os.killpg(pgid, signal.SIGTERM)
+            os.killpg(pgid, signal.SIGCONT)  # A stopped group only acts on SIGTERM once it runs again
+        except ProcessLookupError:
+            return
+        alive = wait_for_processes(processes, timeout)
+        if alive:
+            try:
+                os.killpg(pgid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            for process in alive:  # Processes that left the group
+                try:
+                    process.kill()
+                except psutil.NoSuchProcess:
+                    continue
+
+    def freeze(self, pid):
+        suspended = self._suspended.setdefault(pid, set())
+        try:
+            pgid = os.getpgid(pid)
+            os.killpg(pgid, signal.SIGSTOP)
+            suspended.update(process.pid for process in self._tree(pid) if os.getpgid(process.pid) == pgid)
+        except (ProcessLookupError, psutil.NoSuchProcess):
+            pass
+        self._sweep(pid, suspended)
+        return sorted(suspended)
+
+    def thaw(self, pid):
+        try:
+            os.killpg(os.getpgid(pid), signal.SIGCONT)
+        except ProcessLookupError:
+            pass
+        return super().thaw(pid)
+
+
+class CgroupFreezerBackend(PsutilSweepBackend):
+    """
+    Put each task in its own cgroup v2 child group and freeze it through cgroup.freeze.
+    The kernel freezes every process in the group at once, including children started
+    while the freeze is in progress. Needs write access to the orchestrator's own cgroup.
+    Tasks that can't be moved into a group fall back to the psutil sweep.
+    """
+
+    name = "cgroup"
+
+    def __init__(self, base):
+        super().__init__()
+        self.base = base
+        self._groups = {}  # root pid -> cgroup directory
+
+    @classmethod
+    def detect(cls):
+        """Return a backend for the orchestrator's cgroup, or None if it can't be used."""
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            with open("/proc/self/cgroup") as file:
+                relative = next(line.strip()[3:] for line in file if line.startswith("0::"))
+            base = os.path.join("/sys/fs/cgroup", relative.lstrip("/"))
+            probe = os.path.join(base, f"orchestrator-probe-{os.getpid()}")
+            os.mkdir(probe)
+            try:
+                usable = os.path.exists(os.path.join(probe, "cgroup.freeze"))
+            finally:
+                os.rmdir(probe)
+            return cls(base) if usable else None
+        except (OSError, StopIteration):
+            return None
+
+    def _write(self, group, name, value):
+        with open(os.path.join(group, name), "w") as file:
+            file.write(value)
+
+    def _procs(self, group):
+        with open(os.path.join(group, "cgroup.procs")) as file:
+            return [int(line) for line in file if line.strip()]
+
+    def attach(self, pid):
+        group = os.path.join(self.base, f"orchestrator-task-{pid}")
+        try:
+            os.makedirs(group, exist_ok=True)
+            self._write(group, "cgroup.procs", str(pid))
+            self._groups[pid] = group
+        except OSError as e:
+            log_and_print(f"Could not move process {pid} into cgroup {group}, using psutil instead: {e}", "warning")
+
+    def detach(self, pid):
+        group = self._groups.pop(pid, None)
+        super().detach(pid)
+        if group:
+            try:
+                self._write(group, "cgroup.freeze", "0")
+                os.rmdir(group)  # Fails if something in the task outlived it; the group is left behind then
+            except OSError:
+                pass
+
+    def freeze(self, pid):
+        group = self._groups.get(pid)
+        if not group:
+            return super().freeze(pid)
+        self._write(group, "cgroup.freeze", "1")
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            with open(os.path.join(group, "cgroup.events")) as file:
+                if "frozen 1" in file.read():
+                    break
+            time.sleep(0.01)
+        return self._procs(group)
+
+    def thaw(self, pid):
+        group = self._groups.get(pid)
+        if not group:
+            return super().thaw(pid)
+        self._write(group, "cgroup.freeze", "0")
+        return self._procs(group)
+
+    def thaw_all(self):
+        for pid in list(self._groups):
+            self.thaw(pid)
+        super().thaw_all()
+
+
+def select_suspend_backend(preference=None):
+    """
+    Pick how task process trees are paused: SUSPEND_BACKEND can be 'cgroup', 'pgroup',
+    'psutil' or 'auto' (cgroup v2 freezer if usable, then process groups on POSIX, else psutil).
+    """
+    preference = (preference or SUSPEND_BACKEND).lower()
+    if preference in ("auto", "cgroup"):
+        backend = CgroupFreezerBackend.detect()
+        if backend:
+            return backend
+        if preference == "cgroup":
+            log_and_print("cgroup v2 freezer is not available, falling back to process groups/psutil.", "warning")
+    if preference in ("auto", "cgroup", "pgroup") and os.name == "posix":
+        return ProcessGroupBackend()
+    return PsutilSweepBackend()
+
+
+SUSPENDER = None
+
+
+def get_suspender():
+    global SUSPENDER
+    if SUSPENDER is None:
+        SUSPENDER = select_suspend_backend()
+        log_and_print(f"Using '{SUSPENDER.name}' backend to pause tasks.", "info")
+    return SUSPENDER
+
+
 def pause_process(pid):
     try:
-        process = psutil.Process(pid)
-        process.suspend()
-        PAUSED_PROCESSES.add(pid)
-        RUNNING_PROCESSES.discard(pid)
-        log_and_print(f"Paused process {pid}.", "info")
-
-        for child in get_child_processes(pid):
-            child.suspend()
-            PAUSED_PROCESSES.add(child.pid)
-            RUNNING_PROCESSES.discard(child.pid)
-            log_and_print(f"Paused child process {child.pid}.", "info")
+        start = time.perf_counter()
+        pids = get_suspender().freeze(pid)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        PAUSED_PROCESSES.update(pids)
+        RUNNING_PROCESSES.difference_update(pids)
+        log_and_print(f"Paused process {pid} and its children: {len(pids)} processes frozen in "
+                      f"{elapsed_ms:.0f} ms ({get_suspender().name}).", "info")
     except Exception as e:
         log_and_print(f"Failed to pause process {pid}: {e}", "error")
 
 
 def resume_process(pid):
     try:
-        process = psutil.Process(pid)
-        process.resume()
-        PAUSED_PROCESSES.discard(pid)
-        RUNNING_PROCESSES.add(pid)
-        log_and_print(f"Resumed process {pid}.", "info")
-
-        for child in get_child_processes(pid):
-            child.resume()
-            PAUSED_PROCESSES.discard(child.pid)
-            RUNNING_PROCESSES.add(child.pid)
-            log_and_print(f"Resumed child process {child.pid}.", "info")
+        start = time.perf_counter()
+        pids = get_suspender().thaw(pid)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        PAUSED_PROCESSES.difference_update(pids)
+        RUNNING_PROCESSES.update(pids)
+        log_and_print(f"Resumed process {pid} and its children: {len(pids)} processes thawed in "
+                      f"{elapsed_ms:.0f} ms ({get_suspender().name}).", "info")
     except Exception as e:
         log_and_print(f"Failed to resume process {pid}: {e}", "error")
 
 
-# === Sonarr Functions ===
+# === Metrics ===
 
-def disable_sonarr_download_clients():
-    """Disable all downloaders in Sonarr."""
-    log_and_print("Disabling Sonarr downloaders...", "info")
-    url = f"{SONARR_URL}/api/v3/downloadclient"
-    headers = {"X-Api-Key": SONARR_API_KEY}
+class OrchestratorMetrics:
+    """
+    Live per-task state, published in the Prometheus/OpenMetrics text format.
+    Child CPU and memory are sampled from psutil when the metrics are rendered.
+    """
 
-    response = requests.get(url, headers=headers)
-    if response.status_code != 200:
-        log_and_print(f"Failed to retrieve downloaders: {response.status_code} {response.text}", "error")
-        return
+    DURATION_BUCKETS = (60, 300, 900, 1800, 3600, 7200, 14400, 28800, float("inf"))
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.loop_count = 0
+        self.tasks = {}
+
+    def _task(self, description):
+        return self.tasks.setdefault(description, {
+            "running": 0,
+            "paused": 0,
+            "pid": None,
+            "active_seconds": 0.0,
+            "maintenance_seconds": 0.0,
+            "last_exit_code": None,
+            "started_at": None,
+            "buckets": [0] * len(self.DURATION_BUCKETS),
+            "duration_sum": 0.0,
+            "runs": 0,
+        })
+
+    def loop_started(self, loop_count):
+        with self._lock:
+            self.loop_count = loop_count
+
+    def task_started(self, description):
+        with self._lock:
+            task = self._task(description)
+            task.update(running=1, paused=0, pid=None, started_at=time.time())
+
+    def task_process(self, description, pid):
+        with self._lock:
+            self._task(description)["pid"] = pid
+
+    def task_paused(self, description, paused):
+        with self._lock:
+            self._task(description)["paused"] = int(paused)
+
+    def task_exit_code(self, description, exit_code):
+        with self._lock:
+            self._task(description)["last_exit_code"] = exit_code
+
+    def task_finished(self, description, task_duration, maintenance_time):
+        with self._lock:
+            task = self._task(description)
+            task.update(running=0, paused=0, pid=None)
+            task["active_seconds"] = task_duration - maintenance_time
+            task["maintenance_seconds"] = maintenance_time
+            task["duration_sum"] += task_duration
+            task["runs"] += 1
+            for i, bound in enumerate(self.DURATION_BUCKETS):
+                if task_duration <= bound:
+                    task["buckets"][i] += 1
+
+    @staticmethod
+    def _sample_process_tree(pid):
+        """Return (cpu_seconds, rss_bytes) summed over a process and its children."""
+        cpu_seconds, rss_bytes = 0.0, 0
+        try:
+            parent = psutil.Process(pid)
+            processes = [parent] + parent.children(recursive=True)
+        except psutil.NoSuchProcess:
+            return cpu_seconds, rss_bytes
+        for process in processes:
+            try:
+                cpu = process.cpu_times()
+                cpu_seconds += cpu.user + cpu.system
+                rss_bytes += process.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        return cpu_seconds, rss_bytes
+
+    def render(self):
+        with self._lock:
+            loop_count = self.loop_count
+            tasks = {description: dict(task, buckets=list(task["buckets"]))
+                     for description, task in self.tasks.items()}
+
+        def label(description):
+            escaped = str(description).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            return f'task="{escaped}"'
+
+        lines = [
+            "# HELP orchestrator_loop_count Current loop number.",
+            "# TYPE orchestrator_loop_count gauge",
+            f"orchestrator_loop_count {loop_count}",
+        ]
+        gauges = [
+            ("task_running", "1 while the task is running.", lambda t: t["running"]),
+            ("task_paused", "1 while the task is paused for maintenance.", lambda t: t["paused"]),
+            ("task_active_seconds", "Active time of the last finished run.", lambda t: t["active_seconds"]),
+            ("task_maintenance_seconds", "Maintenance time of the last finished run.",
+             lambda t: t["maintenance_seconds"]),
+            ("task_started_timestamp_seconds", "Unix time the current or last run started.",
+             lambda t: t["started_at"]),
+            ("task_last_exit_code", "Exit code of the last script run.", lambda t: t["last_exit_code"]),
+        ]
+        for name, help_text, value in gauges:
+            lines += [f"# HELP orchestrator_{name} {help_text}", f"# TYPE orchestrator_{name} gauge"]
+            lines += [f"orchestrator_{name}{{{label(d)}}} {value(t)}" for d, t in tasks.items()
+                      if value(t) is not None]
+
+        lines += [
+            "# HELP orchestrator_task_cpu_seconds CPU seconds used by the running task's process tree.",
+            "# TYPE orchestrator_task_cpu_seconds gauge",
+        ]
+        rss_lines = [
+            "# HELP orchestrator_task_rss_bytes Resident memory of the running task's process tree.",
+            "# TYPE orchestrator_task_rss_bytes gauge",
+        ]
+        for description, task in tasks.items():
+            if task["pid"] is None:
+                continue
+            cpu_seconds, rss_bytes = self._sample_process_tree(task["pid"])
+            lines.append(f"orchestrator_task_cpu_seconds{{{label(description)}}} {cpu_seconds:.2f}")
+            rss_lines.append(f"orchestrator_task_rss_bytes{{{label(description)}}} {rss_bytes}")
+        lines += rss_lines
+
+        lines += [
+            "# HELP orchestrator_task_duration_seconds Task run time, including maintenance.",
+            "# TYPE orchestrator_task_duration_seconds histogram",
+        ]
+        for description, task in tasks.items():
+            for bound, count in zip(self.DURATION_BUCKETS, task["buckets"]):
+                le = "+Inf" if bound == float("inf") else bound
+                lines.append(f'orchestrator_task_duration_seconds_bucket{{{label(description)},le="{le}"}} {count}')
+            lines.append(f"orchestrator_task_duration_seconds_sum{{{label(description)}}} {task['duration_sum']:.3f}")
+            lines.append(f"orchestrator_task_duration_seconds_count{{{label(description)}}} {task['runs']}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = OrchestratorMetrics()
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = METRICS.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
 
-    clients = response.json()
-    for client in clients:
-        client_id = client.get("id")
-        client_name = client.get("name")
+    def log_message(self, format, *args):
+        pass  # Keep scrapes out of the console
 
-        if not client.get("enable"):
-            log_and_print(f"Downloader {client_name} is already disabled.", "info")
-            continue
 
-        # Include all fields in the payload
-        disable_url = f"{url}/{client_id}"
-        payload = {
-            **client,  # Copy all fields from the current client
-            "enable": False  # Explicitly set enable to False
-        }
+def write_metrics_textfile(path=None):
+    """Write the metrics atomically, for node_exporter's textfile collector."""
+    path = path or METRICS_TEXTFILE
+    temp_file = f"{path}.tmp"
+    with open(temp_file, "w", encoding="utf-8") as file:
+        file.write(METRICS.render())
+    os.replace(temp_file, path)
 
-        update_response = requests.put(disable_url, json=payload, headers=headers)
-        if update_response.status_code in (200, 202):
-            log_and_print(f"Disabled downloaders: {client_name}", "info")
-        else:
-            log_and_print(f"Failed to disable {client_name}: {update_response.status_code} {update_response.text}", "error")
 
+def start_metrics_exporters():
+    """Start the HTTP metrics endpoint and/or textfile exporter if configured."""
+    if METRICS_PORT:
+        try:
+            server = ThreadingHTTPServer(("0.0.0.0", METRICS_PORT), MetricsRequestHandler)
+        except OSError as e:
+            log_and_print(f"Failed to start metrics endpoint on port {METRICS_PORT}: {e}", "error")
+        else:
+            threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+            log_and_print(f"Serving metrics on http://0.0.0.0:{METRICS_PORT}/metrics", "info")
 
-def enable_sonarr_download_clients():
-    """Enable all downloaders in Sonarr."""
-    log_and_print("Enabling Sonarr downloaders...", "info")
-    url = f"{SONARR_URL}/api/v3/downloadclient"
-    headers = {"X-Api-Key": SONARR_API_KEY}
+    if METRICS_TEXTFILE:
+        def textfile_loop():
+            while True:
+                log_and_continue("writing metrics textfile", write_metrics_textfile)
+                time.sleep(METRICS_TEXTFILE_INTERVAL)
 
-    response = requests.get(url, headers=headers)
-    if response.status_code != 200:
-        log_and_print(f"Failed to retrieve downloaders: {response.status_code} {response.text}", "error")
-        return
+        threading.Thread(target=textfile_loop, name="metrics-textfile", daemon=True).start()
+        log_and_print(f"Writing metrics to {METRICS_TEXTFILE} every {METRICS_TEXTFILE_INTERVAL}s", "info")
 
-    clients = response.json()
-    for client in clients:
-        client_id = client.get("id")
-        client_name = client.get("name")
 
-        if client.get("enable"):
-            log_and_print(f"Downloader {client_name} is already enabled.", "info")
-            continue
+# === Service Control ===
 
-        # Include all fields in the payload
-        enable_url = f"{url}/{client_id}"
-        payload = {
-            **client,  # Copy all fields from the current client
-            "enable": True  # Explicitly set enable to True
-        }
+_SESSIONS = {}
+_SESSIONS_LOCK = threading.Lock()
 
-        update_response = requests.put(enable_url, json=payload, headers=headers)
-        if update_response.status_code in (200, 202):
-            log_and_print(f"Enabled downloaders: {client_name}", "info")
-        else:
-            log_and_print(f"Failed to enable {client_name}: {update_response.status_code} {update_response.text}", "error")
 
-# === Radarr Functions ===
+def get_session(service):
+    """
+    Return the pooled requests.Session for a service, creating it on first use.
+    Reusing one session per service keeps connections alive between calls.
+    """
+    with _SESSIONS_LOCK:
+        session = _SESSIONS.get(service)
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=SERVICE_MAX_WORKERS)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _SESSIONS[service] = session
+        return session
+
+
+def run_in_parallel(calls):
+    """
+    Run (action_name, func) pairs at the same time and wait for all of them.
+    Errors are logged per call, like log_and_continue().
+    """
+    if not calls:
+        return
+    with ThreadPoolExecutor(max_workers=min(len(calls), SERVICE_MAX_WORKERS), thread_name_prefix="service") as pool:
+        for action_name, func in calls:
+            pool.submit(log_and_continue, action_name, func)
 
 
-def disable_radarr_download_clients():
-    """Disable all downloaders in Radarr."""
-    log_and_print("Disabling Radarr downloaders...", "info")
-    url = f"{RADARR_URL}/api/v3/downloadclient"
-    headers = {"X-Api-Key": RADARR_API_KEY}
+def set_arr_download_clients(service, base_url, api_version, api_key, enable):
+    """Enable or disable every download client in a Sonarr/Radarr/Lidarr instance."""
+    action = "Enabling" if enable else "Disabling"
+    log_and_print(f"{action} {service} downloaders...", "info")
+    url = f"{base_url}/api/{api_version}/downloadclient"
+    session = get_session(service)
+    headers = {"X-Api-Key": api_key}
 
-    response = requests.get(url, headers=headers)
+    response = session.get(url, headers=headers, timeout=SERVICE_TIMEOUT)
     if response.status_code != 200:
         log_and_print(f"Failed to retrieve downloaders: {response.status_code} {response.text}", "error")
         return
 
-    clients = response.json()
-    for client in clients:
-        client_id = client.get("id")
+    def update_client(client):
         client_name = client.get("name")
-
-        if not client.get("enable"):
-            log_and_print(f"Downloader {client_name} is already disabled.", "info")
-            continue
-
         # Include all fields in the payload
-        disable_url = f"{url}/{client_id}"
         payload = {
             **client,  # Copy all fields from the current client
-            "enable": False  # Explicitly set enable to False
+            "enable": enable
         }
-
-        update_response = requests.put(disable_url, json=payload, headers=headers)
+        update_response = session.put(f"{url}/{client.get('id')}", json=payload, headers=headers,
+                                      timeout=SERVICE_TIMEOUT)
         if update_response.status_code in (200, 202):
-            log_and_print(f"Disabled downloaders: {client_name}", "info")
+            log_and_print(f"{'Enabled' if enable else 'Disabled'} downloaders: {client_name}", "info")
         else:
-            log_and_print(f"Failed to disable {client_name}: {update_response.status_code} {update_response.text}", "error")
-
+            log_and_print(f"Failed to {'enable' if enable else 'disable'} {client_name}: "
+                          f"{update_response.status_code} {update_response.text}", "error")
+
+    calls = []
+    for client in response.json():
+        if bool(client.get("enable")) == enable:
+            log_and_print(f"Downloader {client.get('name')} is already {'enabled' if enable else 'disabled'}.",
+                          "info")
+            continue
+        calls.append((f"updating {service} downloader {client.get('name')}", lambda c=client: update_client(c)))
+    run_in_parallel(calls)
 
-def enable_radarr_download_clients():
-    """Enable all downloaders in Radarr."""
-    log_and_print("Enabling Radarr downloaders...", "info")
-    url = f"{RADARR_URL}/api/v3/downloadclient"
-    headers = {"X-Api-Key": RADARR_API_KEY}
 
-    response = requests.get(url, headers=headers)
-    if response.status_code != 200:
-        log_and_print(f"Failed to retrieve downloaders: {response.status_code} {response.text}", "error")
-        return
-
-    clients = response.json()
-    for client in clients:
-        client_id = client.get("id")
-        client_name = client.get("name")
+# === Sonarr Functions ===
 
-        if client.get("enable"):
-            log_and_print(f"Downloader {client_name} is already enabled.", "info")
-            continue
+def disable_sonarr_download_clients():
+    """Disable all downloaders in Sonarr."""
+    set_arr_download_clients("Sonarr", SONARR_URL, "v3", SONARR_API_KEY, enable=False)
 
-        # Include all fields in the payload
-        enable_url = f"{url}/{client_id}"
-        payload = {
-            **client,  # Copy all fields from the current client
-            "enable": True  # Explicitly set enable to True
-        }
 
-        update_response = requests.put(enable_url, json=payload, headers=headers)
-        if update_response.status_code in (200, 202):
-            log_and_print(f"Enabled downloaders: {client_name}", "info")
-        else:
-            log_and_print(f"Failed to enable {client_name}: {update_response.status_code} {update_response.text}", "error")
+def enable_sonarr_download_clients():
+    """Enable all downloaders in Sonarr."""
+    set_arr_download_clients("Sonarr", SONARR_URL, "v3", SONARR_API_KEY, enable=True)
 
 
-# === Lidarr Functions ===
+# === Radarr Functions ===
 
-def disable_lidarr_download_clients():
-    """Disable all downloaders in Lidarr."""
-    log_and_print("Disabling Lidarr downloaders...", "info")
-    url = f"{LIDARR_URL}/api/v1/downloadclient"
-    headers = {"X-Api-Key": LIDARR_API_KEY}
+def disable_radarr_download_clients():
+    """Disable all downloaders in Radarr."""
+    set_arr_download_clients("Radarr", RADARR_URL, "v3", RADARR_API_KEY, enable=False)
 
-    response = requests.get(url, headers=headers)
-    if response.status_code != 200:
-        log_and_print(f"Failed to retrieve downloaders: {response.status_code} {response.text}", "error")
-        return
 
-    clients = response.json()
-    for client in clients:
-        client_id = client.get("id")
-        client_name = client.get("name")
+def enable_radarr_download_clients():
+    """Enable all downloaders in Radarr."""
+    set_arr_download_clients("Radarr", RADARR_URL, "v3", RADARR_API_KEY, enable=True)
 
-        if not client.get("enable"):
-            log_and_print(f"Downloader {client_name} is already disabled.", "info")
-            continue
 
-        # Include all fields in the payload
-        disable_url = f"{url}/{client_id}"
-        payload = {
-            **client,  # Copy all fields from the current client
-            "enable": False  # Explicitly set enable to False
-        }
+# === Lidarr Functions ===
 
-        update_response = requests.put(disable_url, json=payload, headers=headers)
-        if update_response.status_code in (200, 202):
-            log_and_print(f"Disabled downloaders: {client_name}", "info")
-        else:
-            log_and_print(f"Failed to disable {client_name}: {update_response.status_code} {update_response.text}", "error")
+def disable_lidarr_download_clients():
+    """Disable all downloaders in Lidarr."""
+    set_arr_download_clients("Lidarr", LIDARR_URL, "v1", LIDARR_API_KEY, enable=False)
 
 
 def enable_lidarr_download_clients():
     """Enable all downloaders in Lidarr."""
-    log_and_print("Enabling Lidarr downloaders...", "info")
-    url = f"{LIDARR_URL}/api/v1/downloadclient"
-    headers = {"X-Api-Key": LIDARR_API_KEY}
-
-    response = requests.get(url, headers=headers)
-    if response.status_code != 200:
-        log_and_print(f"Failed to retrieve downloaders: {response.status_code} {response.text}", "error")
-        return
-
-    clients = response.json()
-    for client in clients:
-        client_id = client.get("id")
-        client_name = client.get("name")
-
-        if client.get("enable"):
-            log_and_print(f"Downloader {client_name} is already enabled.", "info")
-            continue
-
-        # Include all fields in the payload
-        enable_url = f"{url}/{client_id}"
-        payload = {
-            **client,  # Copy all fields from the current client
-            "enable": True  # Explicitly set enable to True
-        }
-
-        update_response = requests.put(enable_url, json=payload, headers=headers)
-        if update_response.status_code in (200, 202):
-            log_and_print(f"Enabled downloaders: {client_name}", "info")
-        else:
-            log_and_print(f"Failed to enable {client_name}: {update_response.status_code} {update_response.text}", "error")
+    set_arr_download_clients("Lidarr", LIDARR_URL, "v1", LIDARR_API_KEY, enable=True)
 
 
 # === Download Client Functions ===
 
+_QBITTORRENT_CLIENT = None
+
 
 def connect_to_qbittorrent():
-    """Connect to the qBittorrent API using the provided environment variables."""
+    """
+    Connect to the qBittorrent API using the provided environment variables.
+    The client is cached, so later calls reuse its login cookie (qbittorrent-api logs in again if it expires).
+    """
+    global _QBITTORRENT_CLIENT
+    if _QBITTORRENT_CLIENT is not None:
+        return _QBITTORRENT_CLIENT
     try:
         client = Client(
             host=QBITTORRENT_URL,
             username=QBITTORRENT_USERNAME,
-            password=QBITTORRENT_PASSWORD
+            password=QBITTORRENT_PASSWORD,
+            REQUESTS_ARGS={"timeout": SERVICE_TIMEOUT},
         )
+        client.auth_log_in()
         logging.info("Connected to qBittorrent successfully.")
+        _QBITTORRENT_CLIENT = client
         return client
     except LoginFailed:
         logging.error("Failed to log in to qBittorrent. Check username/password.")
@@ -700,7 +1547,11 @@ def _resume_qbittorrent_torrents():
 def pause_sabnzbd_downloads():
     """Pause all active downloads in SABnzbd."""
     log_and_print("Pausing SABnzbd downloads...", "info")
-    pause_response = requests.get(f"{SABNZBD_URL}/api?mode=pause&apikey={SABNZBD_API_KEY}")
+    pause_response = get_session("SABnzbd").get(
+        f"{SABNZBD_URL}/api",
+        params={"mode": "pause", "apikey": SABNZBD_API_KEY},
+        timeout=SERVICE_TIMEOUT
+    )
     if pause_response.status_code != 200:
         raise Exception(f"Failed to pause SABnzbd downloads: {pause_response.text}")
 
@@ -708,7 +1559,11 @@ def pause_sabnzbd_downloads():
 def resume_sabnzbd_downloads():
     """Resume all paused downloads in SABnzbd."""
     log_and_print("Resuming SABnzbd downloads...", "info")
-    resume_response = requests.get(f"{SABNZBD_URL}/api?mode=resume&apikey={SABNZBD_API_KEY}")
+    resume_response = get_session("SABnzbd").get(
+        f"{SABNZBD_URL}/api",
+        params={"mode": "resume", "apikey": SABNZBD_API_KEY},
+        timeout=SERVICE_TIMEOUT
+    )
     if resume_response.status_code != 200:
         raise Exception(f"Failed to resume SABnzbd downloads: {resume_response.text}")
 
@@ -716,10 +1571,11 @@ def resume_sabnzbd_downloads():
 def pause_nzbget_downloads():
     """Pause all active downloads in NZBGet."""
     log_and_print("Pausing NZBGet downloads...", "info")
-    pause_response = requests.get(
+    pause_response = get_session("NZBGet").get(
         f"{NZBGET_URL}/jsonrpc",
         auth=(NZBGET_USERNAME, NZBGET_PASSWORD),
-        json={"method": "pausedownload"}
+        json={"method": "pausedownload"},
+        timeout=SERVICE_TIMEOUT
     )
     if pause_response.status_code != 200:
         raise Exception(f"Failed to pause NZBGet downloads: {pause_response.text}")
@@ -728,18 +1584,43 @@ def pause_nzbget_downloads():
 def resume_nzbget_downloads():
     """Resume all paused downloads in NZBGet."""
     log_and_print("Resuming NZBGet downloads...", "info")
-    resume_response = requests.get(
+    resume_response = get_session("NZBGet").get(
         f"{NZBGET_URL}/jsonrpc",
         auth=(NZBGET_USERNAME, NZBGET_PASSWORD),
-        json={"method": "resumedownload"}
+        json={"method": "resumedownload"},
+        timeout=SERVICE_TIMEOUT
     )
     if resume_response.status_code != 200:
         raise Exception(f"Failed to resume NZBGet downloads: {resume_response.text}")
 
 
-def run_script_with_context(script_path, args, start, end, use_venv=None,
+def disable_all_download_clients():
+    """Disable the *arr downloaders and pause every download client, all at the same time."""
+    run_in_parallel([
+        ("disable Sonarr downloaders", disable_sonarr_download_clients),
+        ("disable Radarr downloaders", disable_radarr_download_clients),
+        ("disable Lidarr downloaders", disable_lidarr_download_clients),
+        ("pause qBittorrent", pause_qbittorrent_downloads),
+        ("pause SABnzbd", pause_sabnzbd_downloads),
+        ("pause NZBGet", pause_nzbget_downloads),
+    ])
+
+
+def enable_all_download_clients():
+    """Enable the *arr downloaders and resume every download client, all at the same time."""
+    run_in_parallel([
+        ("enable Sonarr downloaders", enable_sonarr_download_clients),
+        ("enable Radarr downloaders", enable_radarr_download_clients),
+        ("enable Lidarr downloaders", enable_lidarr_download_clients),
+        ("resume qBittorrent", resume_qbittorrent_downloads),
+        ("resume SABnzbd", resume_sabnzbd_downloads),
+        ("resume NZBGet", resume_nzbget_downloads),
+    ])
+
+
+def run_script_with_context(script_path, args, window, use_venv=None,
                             loop_count=None, current_task_idx=None, total_tasks=None,
-                            loop_start_mon=None):
+                            loop_start_mon=None, description=None, limits=None, usage=None):
     loop_count = loop_count or "?"
     current_task_idx = current_task_idx or "?"
     total_tasks = total_tasks or "?"
@@ -747,15 +1628,13 @@ def run_script_with_context(script_path, args, start, end, use_venv=None,
     task_info = f"Loop {loop_count} - Task {current_task_idx} / {total_tasks}"
     log_and_print(f"{task_info}: Running script '{script_path}' with arguments {args}", "info")
 
-    # Change to the script's directory
-    script_dir = os.path.dirname(script_path)
+    # Run from the script's directory. The child gets it as its cwd instead of os.chdir(),
+    # which would change the directory for every task running at the same time.
+    script_dir = os.path.dirname(script_path) or None
     script_name = os.path.basename(script_path)
     log_and_print(TASK_DIVIDER, "info")
     log_and_print(f"Running script '{script_name}' from directory '{script_dir}' with arguments {args}", "info")
 
-    original_dir = os.getcwd()
-    os.chdir(script_dir)
-
     try:
         # Construct the command based on script type
         if script_name.endswith(".py"):
@@ -787,69 +1666,76 @@ def run_script_with_context(script_path, args, start, end, use_venv=None,
         # Run the task and return the results
         return run_task_with_pause_check(
             command,
-            start,
-            end,
+            window,
             loop_count=loop_count,
             current_task_idx=current_task_idx,
             total_tasks=total_tasks,
             loop_start_mon=loop_start_mon,
+            cwd=script_dir,
+            description=description or script_name,
+            limits=limits,
+            usage=usage,
         )
     except Exception as e:
         log_and_print(f"Error while running script '{script_name}': {e}", "error")
+        if usage is not None:
+            usage["error"] = str(e)
         return 0, 0  # Return fallback values in case of an exception
-    finally:
-        os.chdir(original_dir)
 
 
 # === Main Orchestration ===
 
-def monitor_maintenance_and_tasks(config_file):
+def monitor_maintenance_and_tasks(config_file, resume=False):
     """Orchestrate maintenance and tasks based on configuration."""
     try:
         config = validate_and_load_config(config_file)
         tasks = config.get("tasks", [])
         loop_count = 0
+        completed = {}
+        window = MaintenanceWindow()
+        fingerprint = tasks_fingerprint(tasks)
+
+        if resume:
+            loop_count, completed = load_checkpoint(fingerprint)
 
         while True:
-            loop_count += 1
-            log_and_print(f"Starting Loop {loop_count}...", "info")
+            if not completed:
+                loop_count += 1
+            METRICS.loop_started(loop_count)
+            if completed:
+                log_and_print(f"Resuming Loop {loop_count} after {len(completed)} finished tasks...", "info")
+            else:
+                log_and_print(f"Starting Loop {loop_count}...", "info")
 
             loop_start_mon = time.monotonic()
             total_maintenance_time = 0
             total_active_time = 0
             total_task_time = 0
             task_summaries = []
-            start, end = get_plex_maintenance_window()
+            window.refresh()
 
-            for idx, task in enumerate(tasks, start=1):
-                task_progress = f"Loop {loop_count} - Task {idx} / {len(tasks)}: {task.get('description')}"
-                log_and_print(task_progress, "info")
+            results = run_task_graph(
+                tasks, window, loop_count, loop_start_mon, completed=completed,
+                on_task_done=lambda partial, n=loop_count: save_checkpoint(n, partial, fingerprint)
+            )
+            completed = {}
+            loop_wall_time = time.monotonic() - loop_start_mon
 
-                try:
-                    task_duration, maintenance_time = execute_task(
-                        task,
-                        start,
-                        end,
-                        loop_count=loop_count,
-                        current_task_idx=idx,
-                        total_tasks=len(tasks),
-                        loop_start_mon=loop_start_mon
-                    )
-                    active_time = task_duration - maintenance_time
-                    total_maintenance_time += maintenance_time
-                    total_active_time += active_time
-                    total_task_time += task_duration
-
-                    task_summaries.append({
-                        "index": idx,
-                        "description": task.get("description"),
-                        "total_time": format_time(task_duration),
-                        "active_time": format_time(active_time),
-                        "maintenance_time": format_time(maintenance_time),
-                    })
-                except Exception as e:
-                    log_and_print(f"Error during Task {idx}: {e}", "error")
-                    task_duration, maintenance_time = 0, 0
+            for idx, task in enumerate(tasks, start=1):
+                task_duration, maintenance_time, usage = results.get(idx, (0, 0, {}))
+                active_time = task_duration - maintenance_time
+                total_maintenance_time += maintenance_time
+                total_active_time += active_time
+                total_task_time += task_duration
+
+                task_summaries.append({
+                    "index": idx,
+                    "description": task.get("description"),
+                    "total_time": round(task_duration, 3),
+                    "active_time": round(active_time, 3),
+                    "maintenance_time": round(maintenance_time, 3),
+                    **usage,
+                })
 
             # Log detailed task summaries
             log_and_print(LOG_DIVIDER, "info")
@@ -857,9 +1743,11 @@ def monitor_maintenance_and_tasks(config_file):
             for task_summary in task_summaries:
                 log_and_print(
                     f"  Task {task_summary['index']}/{len(tasks)}: {task_summary['description']} - "
-                    f"Total Time: {task_summary['total_time']}, "
-                    f"Active Time: {task_summary['active_time']}, "
-                    f"Maintenance Time: {task_summary['maintenance_time']}",
+                    f"Total Time: {format_time(task_summary['total_time'])}, "
+                    f"Active Time: {format_time(task_summary['active_time'])}, "
+                    f"Maintenance Time: {format_time(task_summary['maintenance_time'])}"
+                    + (f", {format_usage(task_summary)}" if "peak_rss_bytes" in task_summary else "")
+                    + (" - Skipped (failed dependency)" if task_summary.get("skipped") else ""),
                     "info"
                 )
 
@@ -869,22 +1757,90 @@ def monitor_maintenance_and_tasks(config_file):
             log_and_print(f"  Total Loop Time (including maintenance): {format_time(total_task_time)}", "info")
             log_and_print(f"  Total Loop Time (excluding maintenance): {format_time(total_active_time)}", "info")
             log_and_print(f"  Total Maintenance Time: {format_time(total_maintenance_time)}", "info")
+            log_and_print(f"  Loop Wall Time: {format_time(loop_wall_time)}", "info")
             log_and_print(LOG_DIVIDER, "info")
             save_loop_stats(
                 loop_count,
                 task_summaries,
                 total_task_time,
                 total_active_time,
-                total_maintenance_time
+                total_maintenance_time,
+                loop_wall_time
             )
+            save_checkpoint(loop_count, results, fingerprint, finished=True)
 
             # Delay before next loop
             log_and_print(f"Loop {loop_count} - All tasks completed. Restarting the loop after a delay...", "info")
-            time.sleep(60)
+            wait_for_next_loop(loop_count)
     except KeyboardInterrupt:
         log_and_print("Ctrl-C detected. Exiting script...", "warning")
 
 
+def get_plex_change_signature():
+    """
+    Cheap fingerprint of the Plex libraries: one request to /library/sections, using each
+    section's contentChangedAt. updatedAt and scannedAt are left out because Plex bumps them
+    on every scheduled scan, even when nothing was added. Returns None if Plex can't be reached.
+    """
+    try:
+        sections = plex.query("/library/sections")
+        return tuple(
+            (section.get("key"), section.get("contentChangedAt"))
+            for section in sections.findall("Directory")
+        )
+    except Exception as e:
+        log_and_print(f"Failed to check Plex libraries for changes: {e}", "warning")
+        return None
+
+
+def get_path_change_signature(paths=None):
+    """
+    Fingerprint of the watched directories: the mtime of each directory and of its direct entries.
+    Changes deeper in the tree are only seen if they touch one of those.
+    """
+    signature = []
+    for path in paths if paths is not None else LOOP_WATCH_PATHS:
+        try:
+            entries = sorted((entry.name, entry.stat().st_mtime_ns) for entry in os.scandir(path))
+            signature.append((path, os.stat(path).st_mtime_ns, tuple(entries)))
+        except OSError:
+            signature.append((path, None, ()))
+    return tuple(signature)
+
+
+def get_change_signature():
+    return get_plex_change_signature(), get_path_change_signature()
+
+
+def wait_for_next_loop(loop_count):
+    """
+    Wait before starting the next loop. With LOOP_TRIGGER=always this is a fixed LOOP_DELAY.
+    With LOOP_TRIGGER=change, Plex and LOOP_WATCH_PATHS are checked after LOOP_DELAY, then at
+    exponentially growing intervals (up to LOOP_MAX_DELAY), and the next loop starts as soon as
+    something changed, or after LOOP_MAX_IDLE seconds without changes.
+    The baseline is taken when the loop ends, so changes made by the loop's own tasks don't count.
+    """
+    if LOOP_TRIGGER != "change":
+        time.sleep(LOOP_DELAY)
+        return
+
+    baseline = get_change_signature()
+    idle_start = time.monotonic()
+    delay = LOOP_DELAY
+    while True:
+        time.sleep(delay)
+        if get_change_signature() != baseline:
+            log_and_print(f"Loop {loop_count}: Changes detected. Starting the next loop.", "info")
+            return
+        idle = time.monotonic() - idle_start
+        if idle >= LOOP_MAX_IDLE:
+            log_and_print(f"Loop {loop_count}: No changes for {format_time(idle)}. Starting the next loop anyway.",
+                          "info")
+            return
+        delay = min(delay * 2, LOOP_MAX_DELAY, max(1, LOOP_MAX_IDLE - idle))
+        log_and_print(f"Loop {loop_count}: No changes detected. Checking again in {format_time(delay)}.", "info")
+
+
 def delete_temp_files(config_file):
     """
     Delete specific temporary files if they exist, based on the tasks configuration.
@@ -920,12 +1876,14 @@ def delete_temp_files(config_file):
 def terminate_all_processes():
     """Terminate all running and paused processes."""
     log_and_print("Terminating all subprocesses...", "warning")
+    if SUSPENDER is not None:
+        SUSPENDER.thaw_all()  # Stopped/frozen processes can't act on the termination signal
     for pid in list(RUNNING_PROCESSES | PAUSED_PROCESSES):
         try:
             process = psutil.Process(pid)
-            log_and_print(f"Terminating process {pid} ({process.name()}).", "info")
-            process.terminate()  # Send termination signal
-            process.wait(timeout=5)  # Wait for process to terminate
+            log_and_print(f"Terminating process {pid} ({process.name()}) and its children.", "info")
+            # SIGTERM to the process tree (or the task's process group), SIGKILL after 5 seconds
+            get_suspender().terminate(pid)
         except psutil.NoSuchProcess:
             log_and_print(f"Process {pid} already terminated.", "info")
         except Exception as e:
@@ -982,34 +1940,422 @@ def validate_tasks_config(tasks):
             raise ValueError(f"Task {idx}: 'args' must be a list.")
         if "use_venv" in task and task["use_venv"] is not None and not isinstance(task["use_venv"], str):
             raise ValueError(f"Task {idx}: 'use_venv' must be a string or null.")
+        if "depends_on" in task and not isinstance(task["depends_on"], (str, list)):
+            raise ValueError(f"Task {idx}: 'depends_on' must be a task description or a list of them.")
+        if "resource" in task and task["resource"] is not None and not isinstance(task["resource"], str):
+            raise ValueError(f"Task {idx}: 'resource' must be a string or null.")
+        if "max_parallel" in task:
+            if "resource" not in task or task["resource"] is None:
+                raise ValueError(f"Task {idx}: 'max_parallel' requires a 'resource'.")
+            if not isinstance(task["max_parallel"], int) or isinstance(task["max_parallel"], bool) \
+                    or task["max_parallel"] < 1:
+                raise ValueError(f"Task {idx}: 'max_parallel' must be a positive integer.")
+        if "nice" in task and (isinstance(task["nice"], bool) or not isinstance(task["nice"], int)
+                               or not -20 <= task["nice"] <= 19):
+            raise ValueError(f"Task {idx}: 'nice' must be an integer from -20 to 19.")
+        if "ionice" in task and task["ionice"] not in ("idle", "low", "normal"):
+            raise ValueError(f"Task {idx}: 'ionice' must be 'idle', 'low' or 'normal'.")
+        if "cpu_affinity" in task and (not isinstance(task["cpu_affinity"], list) or not task["cpu_affinity"]
+                                       or not all(isinstance(cpu, int) and not isinstance(cpu, bool) and cpu >= 0
+                                                  for cpu in task["cpu_affinity"])):
+            raise ValueError(f"Task {idx}: 'cpu_affinity' must be a non-empty list of CPU numbers.")
+        if "memory_limit" in task:
+            try:
+                if isinstance(task["memory_limit"], bool) or parse_size(task["memory_limit"]) <= 0:
+                    raise ValueError
+            except (TypeError, ValueError):
+                raise ValueError(f"Task {idx}: 'memory_limit' must be a size such as 512M or 2G.")
+        if any(key in task for key in RESOURCE_LIMIT_KEYS) and "script_path" not in task:
+            raise ValueError(f"Task {idx}: resource limits only apply to 'script_path' tasks.")
+
+    # Dependencies refer to other tasks by description, so those must exist and be unique
+    descriptions = [task["description"] for task in tasks]
+    for idx, task in enumerate(tasks, start=1):
+        for dep in get_task_dependencies(task):
+            if dep not in descriptions:
+                raise ValueError(f"Task {idx}: 'depends_on' refers to unknown task '{dep}'.")
+            if descriptions.count(dep) > 1:
+                raise ValueError(f"Task {idx}: 'depends_on' refers to '{dep}', which is not a unique description.")
+            if dep == task["description"]:
+                raise ValueError(f"Task {idx}: a task cannot depend on itself.")
+
+    # Kahn's algorithm: if some tasks can never become ready, the graph has a cycle
+    graph = build_task_graph(tasks)
+    done = set()
+    ready = [idx for idx, deps in graph.items() if not deps]
+    while ready:
+        done.add(ready.pop())
+        ready.extend(idx for idx, deps in graph.items() if idx not in done and idx not in ready and deps <= done)
+    if len(done) != len(graph):
+        stuck = ", ".join(tasks[idx - 1]["description"] for idx in sorted(set(graph) - done))
+        raise ValueError(f"Circular 'depends_on' between tasks: {stuck}")
+
+
+def get_task_dependencies(task):
+    """Return the list of task descriptions a task depends on."""
+    deps = task.get("depends_on") or []
+    return [deps] if isinstance(deps, str) else deps
+
+
+def build_task_graph(tasks):
+    """Map each task index (1-based) to the set of task indices it depends on."""
+    index_by_description = {task["description"]: idx for idx, task in enumerate(tasks, start=1)}
+    return {
+        idx: {index_by_description[dep] for dep in get_task_dependencies(task)}
+        for idx, task in enumerate(tasks, start=1)
+    }
+
+
+def get_resource_limits(tasks):
+    """
+    Map each resource name to how many tasks using it may run at once.
+    Tasks sharing a resource run one at a time unless 'max_parallel' says otherwise;
+    if tasks disagree, the smallest limit wins.
+    """
+    limits = {}
+    for task in tasks:
+        resource = task.get("resource")
+        if resource:
+            limit = task.get("max_parallel", 1)
+            limits[resource] = min(limit, limits.get(resource, limit))
+    return limits
+
+
+def usage_failed(usage):
+    """True if a task's usage dict (or a task summary, which includes it) marks it as failed or skipped."""
+    return bool(usage.get("error") or usage.get("skipped")) or usage.get("exit_code") not in (None, 0)
+
+
+def task_failed(result):
+    """True if a (task_duration, maintenance_time, usage) result is a failed or skipped task."""
+    return usage_failed(result[2])
+
 
+def run_task_graph(tasks, window, loop_count, loop_start_mon, completed=None, on_task_done=None):
+    """
+    Run one loop's worth of tasks, starting each task as soon as its dependencies have finished,
+    a resource slot is free and fewer than MAX_PARALLEL_TASKS tasks are running.
+    Ready tasks are started in tasks.yml order, so MAX_PARALLEL_TASKS=1 keeps the original sequential behavior.
+    `completed` holds results of tasks already finished in this loop (when resuming); they aren't run again.
+    `on_task_done(results)` is called after each task finishes.
+    A task whose dependency failed (non-zero exit code or an error), or was itself skipped, is not run;
+    its usage is {"skipped": True, "failed_dependencies": [...]}.
+    Returns a dict mapping task index to (task_duration, maintenance_time, usage).
+    """
+    graph = build_task_graph(tasks)
+    resource_limits = get_resource_limits(tasks)
+    resource_usage = {}
+    results = dict(completed or {})
+    done = set(results)
+    failed = {idx for idx, result in results.items() if task_failed(result)}
+    pending = [idx for idx in sorted(graph) if idx not in done]
+    futures = {}
+
+    executor = ThreadPoolExecutor(max_workers=MAX_PARALLEL_TASKS, thread_name_prefix="task")
+    try:
+        while pending or futures:
+            for idx in list(pending):
+                task = tasks[idx - 1]
+                if graph[idx] & failed:
+                    failed_dependencies = [tasks[dep - 1].get("description") for dep in sorted(graph[idx] & failed)]
+                    log_and_print(f"Loop {loop_count} - Task {idx} / {len(tasks)}: Skipping "
+                                  f"'{task.get('description')}' because it depends on failed or skipped "
+                                  f"tasks: {', '.join(failed_dependencies)}", "warning")
+                    pending.remove(idx)
+                    done.add(idx)
+                    failed.add(idx)
+                    results[idx] = (0, 0, {"skipped": True, "failed_dependencies": failed_dependencies})
+                    if on_task_done:
+                        on_task_done(results)
+                    continue
+                if len(futures) >= MAX_PARALLEL_TASKS:
+                    break
+                resource = task.get("resource")
+                if not graph[idx] <= done:
+                    continue
+                if resource and resource_usage.get(resource, 0) >= resource_limits[resource]:
+                    continue
+
+                pending.remove(idx)
+                if resource:
+                    resource_usage[resource] = resource_usage.get(resource, 0) + 1
+                log_and_print(f"Loop {loop_count} - Task {idx} / {len(tasks)}: {task.get('description')}", "info")
+                future = executor.submit(
+                    execute_task,
+                    task,
+                    window,
+                    loop_count=loop_count,
+                    current_task_idx=idx,
+                    total_tasks=len(tasks),
+                    loop_start_mon=loop_start_mon,
+                )
+                futures[future] = idx
+
+            # Ctrl-C is only delivered to the main thread, and only between bytecodes, so never block indefinitely
+            finished, _ = wait(futures, timeout=1, return_when=FIRST_COMPLETED)
+            for future in finished:
+                idx = futures.pop(future)
+                resource = tasks[idx - 1].get("resource")
+                if resource:
+                    resource_usage[resource] -= 1
+                done.add(idx)
+                try:
+                    results[idx] = future.result()
+                except Exception as e:
+                    log_and_print(f"Error during Task {idx}: {e}", "error")
+                    results[idx] = (0, 0, {"error": str(e)})
+                if task_failed(results[idx]):
+                    failed.add(idx)
+                if on_task_done:
+                    on_task_done(results)
+    except KeyboardInterrupt:
+        # The task threads only return once their process exits, so stop the process trees before leaving
+        log_and_print("Ctrl-C detected. Terminating running tasks...", "warning")
+        executor.shutdown(wait=False, cancel_futures=True)
+        terminate_all_processes()
+        raise
+    except BaseException:
+        # Don't block on running tasks here; main() terminates their processes during cleanup
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown(wait=True)
+    return results
 
-def save_loop_stats(loop_count, task_summaries, total_task_time, total_active_time, total_maintenance_time):
-    stats_file = "stats/task_stats.json"
+
+def tasks_fingerprint(tasks):
+    """Hash of the task list, so a checkpoint is only resumed against the same tasks.yml."""
+    return hashlib.sha1(json.dumps(tasks, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def save_checkpoint(loop_count, results, fingerprint, finished=False):
+    """
+    Record which tasks of the current loop have finished, written atomically after every task.
+    A finished loop is recorded so --resume starts the next one.
+    """
+    data = {
+        "loop": loop_count,
+        "finished": finished,
+        "tasks_fingerprint": fingerprint,
+        "timestamp": datetime.now().isoformat(),
+        "results": {str(idx): list(result) for idx, result in results.items()},
+    }
+    temp_file = f"{CHECKPOINT_FILE}.tmp"
+    with open(temp_file, "w") as file:
+        json.dump(data, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_file, CHECKPOINT_FILE)
+
+
+def load_checkpoint(fingerprint):
+    """
+    Return (loop_count, completed_results) to resume from. For a loop that was cut short, loop_count
+    is that loop and completed_results holds its finished tasks; otherwise completed_results is empty
+    and the next loop number follows loop_count.
+    """
+    if not os.path.exists(CHECKPOINT_FILE):
+        log_and_print("No checkpoint found. Starting at loop 1.", "info")
+        return 0, {}
+    try:
+        with open(CHECKPOINT_FILE, "r") as file:
+            checkpoint = json.load(file)
+    except (OSError, json.JSONDecodeError) as e:
+        log_and_print(f"Failed to read checkpoint {CHECKPOINT_FILE}, starting at loop 1: {e}", "error")
+        return 0, {}
+
+    loop_count = checkpoint.get("loop", 0)
+    if checkpoint.get("finished"):
+        log_and_print(f"Checkpoint: loop {loop_count} finished. Resuming at loop {loop_count + 1}.", "info")
+        return loop_count, {}
+    if checkpoint.get("tasks_fingerprint") != fingerprint:
+        log_and_print(f"Checkpoint: tasks changed since loop {loop_count} was interrupted. "
+                      f"Starting loop {loop_count + 1} from the first task.", "warning")
+        return loop_count, {}
+
+    completed = {int(idx): tuple(result) for idx, result in checkpoint.get("results", {}).items()}
+    log_and_print(f"Checkpoint: resuming loop {loop_count} with {len(completed)} tasks already finished.", "info")
+    return loop_count, completed
+
+
+def parse_duration(value):
+    """Convert a stored duration (seconds, or an 'HH:MM:SS' string from older stats) to seconds."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    return float(sum(int(x) * 60 ** i for i, x in enumerate(reversed(value.split(":")))))
+
+
+def append_json_line(record, file_path):
+    """
+    Append one record as a JSON line and fsync it, so a crash can at worst lose
+    the line being written rather than corrupt the whole file.
+    """
+    with open(file_path, "a", encoding="utf-8") as file:
+        file.write(json.dumps(record) + "\n")
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def migrate_legacy_stats(legacy_file=LEGACY_STATS_FILE, stats_file=STATS_FILE):
+    """
+    One-time import of the old stats/task_stats.json (a single JSON array with
+    HH:MM:SS strings) into the JSON Lines store. The old file is renamed afterwards.
+    """
+    if not os.path.exists(legacy_file):
+        return
+
+    try:
+        with open(legacy_file, "r") as file:
+            legacy_data = json.load(file)
+    except (OSError, json.JSONDecodeError) as e:
+        log_and_print(f"Failed to read legacy stats file {legacy_file}: {e}", "error")
+        return
+
+    lines = []
+    for loop in legacy_data:
+        lines.append(json.dumps({
+            **loop,
+            "tasks": [
+                {**task, **{key: parse_duration(task[key])
+                            for key in ("total_time", "active_time", "maintenance_time") if key in task}}
+                for task in loop.get("tasks", [])
+            ],
+            "totals": {
+                key: (value if key == "total_tasks" else parse_duration(value))
+                for key, value in loop.get("totals", {}).items()
+            },
+        }) + "\n")
+
+    # Old loops go before anything already in the new store
+    if os.path.exists(stats_file):
+        with open(stats_file, "r", encoding="utf-8") as file:
+            lines.extend(file.readlines())
+    temp_file = f"{stats_file}.tmp"
+    with open(temp_file, "w", encoding="utf-8") as file:
+        file.writelines(lines)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_file, stats_file)
+    os.replace(legacy_file, f"{legacy_file}.migrated")
+    log_and_print(f"Migrated {len(legacy_data)} loops from {legacy_file} to {stats_file}", "info")
+
+
+def save_loop_stats(loop_count, task_summaries, total_task_time, total_active_time, total_maintenance_time,
+                    loop_wall_time=None):
+    """Append one loop's stats to the JSON Lines stats file. Durations are stored in seconds."""
     data = {
         "loop": loop_count,
         "timestamp": datetime.now().isoformat(),
         "tasks": task_summaries,
         "totals": {
             "total_tasks": len(task_summaries),
-            "total_task_time": format_time(total_task_time),
-            "total_active_time": format_time(total_active_time),
-            "total_maintenance_time": format_time(total_maintenance_time),
+            "total_task_time": round(total_task_time, 3),
+            "total_active_time": round(total_active_time, 3),
+            "total_maintenance_time": round(total_maintenance_time, 3),
+            # With MAX_PARALLEL_TASKS > 1 this is shorter than total_task_time
+            "loop_wall_time": round(loop_wall_time if loop_wall_time is not None else total_task_time, 3),
         },
     }
 
-    # Append to stats file
-    stats_path = Path(stats_file)
-    if stats_path.exists():
-        with open(stats_file, "r") as file:
-            existing_data = json.load(file)
-            existing_data.append(data)
-    else:
-        existing_data = [data]
+    append_json_line(data, STATS_FILE)
+    log_and_print(f"Saved loop stats to {STATS_FILE}", "info")
+    log_and_continue("anomaly detection", detect_task_anomalies, loop_count, task_summaries, total_active_time)
+
+
+class DurationAnomalyDetector:
+    """
+    Online anomaly detector for task durations, keyed by task description.
+    Keeps an exponentially weighted mean and variance per task, so each update is O(1).
+    Values are clipped to the current threshold band before they update the estimates,
+    so a single outlier can't drag the baseline toward itself.
+    """
+
+    def __init__(self, state_file=ANOMALY_STATE_FILE, alpha=ANOMALY_ALPHA, threshold=ANOMALY_Z_THRESHOLD,
+                 warmup=ANOMALY_WARMUP, min_deviation=ANOMALY_MIN_DEVIATION):
+        self.state_file = state_file
+        self.alpha = alpha
+        self.threshold = threshold
+        self.warmup = warmup
+        self.min_deviation = min_deviation
+        self.state = {}
+        if os.path.exists(state_file):
+            try:
+                with open(state_file, "r") as file:
+                    self.state = json.load(file)
+            except (OSError, json.JSONDecodeError) as e:
+                log_and_print(f"Failed to read anomaly state {state_file}, starting fresh: {e}", "warning")
+
+    def update(self, key, value):
+        """
+        Check `value` against the baseline for `key` and fold it in.
+        Returns (expected, z_score) if it is an anomaly, otherwise None.
+        """
+        entry = self.state.setdefault(key, {"mean": 0.0, "var": 0.0, "count": 0})
+        mean, var, count = entry["mean"], entry["var"], entry["count"]
+        std = var ** 0.5
+        anomaly = None
+
+        if count >= self.warmup:
+            deviation = value - mean
+            z_score = deviation / std if std > 0 else float("inf")
+            if abs(z_score) > self.threshold and abs(deviation) > self.min_deviation:
+                anomaly = (mean, z_score)
+            # Winsorize so the outlier only nudges the baseline
+            band = max(self.threshold * std, self.min_deviation)
+            value = min(max(value, mean - band), mean + band)
+            alpha = self.alpha
+        else:
+            alpha = 1 / (count + 1)  # Plain running mean/variance until there is enough history
+
+        delta = value - mean
+        entry["mean"] = mean + alpha * delta
+        entry["var"] = (1 - alpha) * (var + alpha * delta * delta)
+        entry["count"] = count + 1
+        return anomaly
+
+    def save(self):
+        temp_file = f"{self.state_file}.tmp"
+        with open(temp_file, "w") as file:
+            json.dump(self.state, file)
+        os.replace(temp_file, self.state_file)
+
+
+_ANOMALY_DETECTOR = None
 
-    with open(stats_file, "w") as file:
-        json.dump(existing_data, file, indent=4)
-    log_and_print(f"Saved loop stats to {stats_file}", "info")
+
+def detect_task_anomalies(loop_count, task_summaries, total_active_time):
+    """
+    Feed one loop's active times into the anomaly detector. Anomalies are logged as a
+    warning and appended to the structured anomaly log.
+    Failed and skipped tasks are left out, so a crash after a few seconds doesn't skew the baseline;
+    the loop total is only fed when every task succeeded.
+    """
+    global _ANOMALY_DETECTOR
+    if _ANOMALY_DETECTOR is None:
+        _ANOMALY_DETECTOR = DurationAnomalyDetector()
+
+    samples = [(task["description"], task["active_time"]) for task in task_summaries if not usage_failed(task)]
+    if len(samples) == len(task_summaries):
+        samples.append(("__loop_total__", total_active_time))
+    for key, seconds in samples:
+        anomaly = _ANOMALY_DETECTOR.update(key, seconds)
+        if not anomaly:
+            continue
+        expected, z_score = anomaly
+        name = "Loop total" if key == "__loop_total__" else f"Task '{key}'"
+        log_and_print(
+            f"Loop {loop_count} anomaly: {name} took {format_time(seconds)} "
+            f"(expected about {format_time(expected)}, z={z_score:.1f})",
+            "warning"
+        )
+        append_json_line({
+            "timestamp": datetime.now().isoformat(),
+            "loop": loop_count,
+            "task": key,
+            "seconds": round(seconds, 3),
+            "expected_seconds": round(expected, 3),
+            "z_score": round(z_score, 2) if z_score != float("inf") else None,
+        }, ANOMALY_LOG_FILE)
+    _ANOMALY_DETECTOR.save()
 
 
 def main():
@@ -1017,6 +2363,7 @@ def main():
         setup_directories()
         log_and_print(LOG_DIVIDER, "info")
         log_and_print("Script started.", "info")
+        migrate_legacy_stats()
 
         # Connect to Plex
         global plex
@@ -1027,7 +2374,8 @@ def main():
             return
 
         delete_temp_files(args.config)
-        monitor_maintenance_and_tasks(args.config)
+        start_metrics_exporters()
+        monitor_maintenance_and_tasks(args.config, resume=args.resume)
     except KeyboardInterrupt:
         log_and_print("Ctrl-C detected. Exiting script and cleaning up...", "warning")
     except Exception as e:
@@ -1038,12 +2386,7 @@ def main():
             delete_temp_files(args.config)
             terminate_all_processes()
             # Ensure all paused services and downloads are resumed
-            log_and_continue("enable Sonarr downloaders", enable_sonarr_download_clients)
-            log_and_continue("enable Radarr downloaders", enable_radarr_download_clients)
-            log_and_continue("enable Lidarr downloaders", enable_lidarr_download_clients)
-            log_and_continue("resume qBittorrent", resume_qbittorrent_downloads)
-            log_and_continue("resume SABnzbd", resume_sabnzbd_downloads)
-            log_and_continue("resume NZBGet", resume_nzbget_downloads)
+            enable_all_download_clients()
         except Exception as e:
             log_and_print(f"Error during cleanup: {e}", "error")
         log_and_print(LOG_DIVIDER, "info")
@@ -1052,6 +2395,8 @@ def main():
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Orchestrator Script")
     parser.add_argument("--config", help="Path to tasks configuration file", default="tasks.yml")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue from the first unfinished task of the last run instead of starting at loop 1")
 
     args = parser.parse_args()
 
@@ -0,0 +1,45 @@
+import io
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import orchestrator  # noqa: E402
+
+
+def read_log(path):
+    with open(path, encoding="utf-8") as file:
+        return file.read().splitlines()
+
+
+def test_carriage_return_output_is_logged_while_the_task_runs(tmp_path, monkeypatch):
+    monkeypatch.setattr(orchestrator, "TASK_LOG_DIR", str(tmp_path))
+    capture = orchestrator.TaskOutputCapture("progress")
+    read_fd, write_fd = os.pipe()
+    reader = threading.Thread(target=capture._read, args=("stdout", io.open(read_fd, "rb")))
+    reader.start()
+
+    # A progress bar: redraws with \r only, never a \n
+    with io.open(write_fd, "wb", buffering=0) as pipe:
+        for percent in range(50):
+            pipe.write(f"\r{percent:3d}%|{'#' * percent}".encode())
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline and len(read_log(capture.log_file)) < 49:
+            time.sleep(0.01)
+        assert reader.is_alive()  # The stream is still open
+        lines = read_log(capture.log_file)
+        assert len(lines) >= 49
+        assert lines[-1].endswith(" - stdout -  48%|" + "#" * 48)
+    reader.join(5)
+    capture.close(0)
+    assert capture.tail("stdout")[-1] == " 49%|" + "#" * 49
+
+
+def test_long_output_without_line_breaks_is_split(tmp_path, monkeypatch):
+    monkeypatch.setattr(orchestrator, "TASK_LOG_DIR", str(tmp_path))
+    monkeypatch.setattr(orchestrator, "TASK_OUTPUT_MAX_LINE", 1000)
+    capture = orchestrator.TaskOutputCapture("long")
+    capture._read("stdout", io.BufferedReader(io.BytesIO(b"x" * 2500 + b"\r\nend\r\n")))
+    capture.close(0)
+    assert capture.tail("stdout") == ["x" * 1000, "x" * 1000, "x" * 500, "end"]
@@ -5,6 +5,8 @@ import matplotlib.pyplot as plt
 import numpy as np
 from datetime import datetime
 import glob
+import hashlib
+import zipfile
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -13,6 +15,10 @@ load_dotenv()
 MAX_IMAGES = int(os.getenv("MAX_IMAGES", "50"))  # Default to 50 images if not specified
 THRESHOLD = float(os.getenv("ANOMALY_THRESHOLD", "1.5"))  # Default is 1.5
 
+STATS_FILE = "stats/task_stats.jsonl"
+LEGACY_STATS_FILE = "stats/task_stats.json"
+CACHE_FILE = "stats/task_stats_cache.npz"
+
 
 def cleanup_images_directory(directory="images", max_images=MAX_IMAGES):
     """
@@ -34,18 +40,36 @@ def cleanup_images_directory(directory="images", max_images=MAX_IMAGES):
         print(f"Deleted old image file: {oldest_file}")
 
 
-# Load stats from the JSON file
-def load_stats(file_path="stats/task_stats.json"):
+# Load stats from the JSON Lines file written by orchestrator.py
+def load_stats(file_path=STATS_FILE, legacy_file_path=LEGACY_STATS_FILE):
+    if not os.path.exists(file_path) and os.path.exists(legacy_file_path):
+        # orchestrator.py hasn't migrated the old single-array file yet
+        try:
+            with open(legacy_file_path, "r") as file:
+                return json.load(file)
+        except json.JSONDecodeError as e:
+            print(f"Failed to parse JSON in stats file '{legacy_file_path}': {e}. Returning empty dataset.")
+            sys.exit(1)  # Exit with an error code
+
     try:
-        with open(file_path, "r") as file:
-            data = json.load(file)
-        return data
+        with open(file_path, "rb") as file:
+            return parse_stats_lines(file.read(), file_path)
     except FileNotFoundError:
         print(f"Stats file '{file_path}' not found. Returning empty dataset.")
         sys.exit(1)  # Exit with an error code
-    except json.JSONDecodeError as e:
-        print(f"Failed to parse JSON in stats file '{file_path}': {e}. Returning empty dataset.")
-        sys.exit(1)  # Exit with an error code
+
+
+def parse_stats_lines(chunk, file_path=STATS_FILE):
+    """Parse JSON lines from a bytes chunk, skipping lines that can't be read (e.g. cut short by a crash)."""
+    data = []
+    for line in chunk.splitlines():
+        if not line.strip():
+            continue
+        try:
+            data.append(json.loads(line))
+        except json.JSONDecodeError as e:
+            print(f"Skipping unreadable line in stats file '{file_path}': {e}")
+    return data
 
 
 def setup_directories():
@@ -58,72 +82,186 @@ def setup_directories():
     print("Directories set up: logs/, images/, stats/")
 
 
+def to_seconds(value):
+    """Convert a stored duration (seconds, or an 'HH:MM:SS' string from older stats) to seconds."""
+    if isinstance(value, (int, float)):
+        return value
+    return sum(int(x) * 60 ** i for i, x in enumerate(reversed(value.split(":"))))
+
+
+def empty_arrays():
+    return {
+        "loops": np.empty(0, dtype=np.int64),
+        "timestamps": np.empty(0, dtype="U32"),
+        "total_times": np.empty(0),
+        "active_times": np.empty(0),
+        "maintenance_times": np.empty(0),
+        "task_loops": np.empty(0, dtype=np.int64),
+        "task_ids": np.empty(0, dtype=np.int64),
+        "task_total_times": np.empty(0),
+        "task_active_times": np.empty(0),
+        "task_maintenance_times": np.empty(0),
+        "descriptions": np.empty(0, dtype="U1"),
+    }
+
+
 # Extract metrics for visualization
-def extract_metrics(data):
-    if not data:
-        print("Error: No data available in the stats file. Exiting.")
-        sys.exit(1)  # Exit if the data is empty
+def extract_metrics(data, descriptions=None):
+    """
+    Turn loop records into NumPy arrays in a single pass. Task descriptions are stored once
+    in `descriptions` and referenced by index from `task_ids`.
+    """
+    descriptions = list(descriptions) if descriptions is not None else []
+    description_ids = {desc: i for i, desc in enumerate(descriptions)}
 
-    loops = []
-    total_times = []
-    active_times = []
-    maintenance_times = []
-    task_stats = []
+    loops, timestamps, totals = [], [], []
+    task_loops, task_ids, task_times = [], [], []
 
     for loop in data:
         loops.append(loop["loop"])
-        total_times.append(
-            sum(int(x) * 60 ** i for i, x in enumerate(reversed(loop["totals"]["total_task_time"].split(":"))))
-        )
-        active_times.append(
-            sum(int(x) * 60 ** i for i, x in enumerate(reversed(loop["totals"]["total_active_time"].split(":"))))
-        )
-        maintenance_times.append(
-            sum(int(x) * 60 ** i for i, x in enumerate(reversed(loop["totals"]["total_maintenance_time"].split(":"))))
-        )
-        task_stats.extend([
-            {
-                "loop": loop["loop"],
-                "description": task["description"],
-                "total_time": sum(int(x) * 60 ** i for i, x in enumerate(reversed(task["total_time"].split(":")))),
-                "active_time": sum(int(x) * 60 ** i for i, x in enumerate(reversed(task["active_time"].split(":")))),
-                "maintenance_time": sum(
-                    int(x) * 60 ** i for i, x in enumerate(reversed(task["maintenance_time"].split(":")))),
-            }
-            for task in loop["tasks"]
-        ])
-
-    return loops, total_times, active_times, maintenance_times, task_stats
+        timestamps.append(loop["timestamp"])
+        loop_totals = loop["totals"]
+        totals.append((
+            to_seconds(loop_totals["total_task_time"]),
+            to_seconds(loop_totals["total_active_time"]),
+            to_seconds(loop_totals["total_maintenance_time"]),
+        ))
+        for task in loop["tasks"]:
+            desc = task["description"]
+            if desc not in description_ids:
+                description_ids[desc] = len(descriptions)
+                descriptions.append(desc)
+            task_loops.append(loop["loop"])
+            task_ids.append(description_ids[desc])
+            task_times.append((
+                to_seconds(task["total_time"]),
+                to_seconds(task["active_time"]),
+                to_seconds(task["maintenance_time"]),
+            ))
+
+    totals = np.array(totals, dtype=float).reshape(-1, 3)
+    task_times = np.array(task_times, dtype=float).reshape(-1, 3)
+    return {
+        "loops": np.array(loops, dtype=np.int64),
+        "timestamps": np.array(timestamps, dtype="U32"),
+        "total_times": totals[:, 0],
+        "active_times": totals[:, 1],
+        "maintenance_times": totals[:, 2],
+        "task_loops": np.array(task_loops, dtype=np.int64),
+        "task_ids": np.array(task_ids, dtype=np.int64),
+        "task_total_times": task_times[:, 0],
+        "task_active_times": task_times[:, 1],
+        "task_maintenance_times": task_times[:, 2],
+        "descriptions": np.array(descriptions, dtype=str) if descriptions else np.empty(0, dtype="U1"),
+    }
+
+
+def append_arrays(cached, new):
+    """Append newly parsed loops to the cached arrays (`new` already includes all descriptions)."""
+    merged = {key: np.concatenate([cached[key], new[key]]) for key in cached if key != "descriptions"}
+    merged["descriptions"] = new["descriptions"]
+    return merged
+
+
+def load_stats_arrays(file_path=STATS_FILE, cache_path=CACHE_FILE, legacy_file_path=LEGACY_STATS_FILE):
+    """
+    Load the stats history as NumPy arrays. The parsed arrays are cached in `cache_path`
+    together with the size, mtime and first line of the stats file, so later runs only
+    parse the loops appended since then.
+    """
+    if not os.path.exists(file_path):
+        return extract_metrics(load_stats(file_path, legacy_file_path))
+
+    stat = os.stat(file_path)
+    with open(file_path, "rb") as file:
+        head = hashlib.sha1(file.readline()).hexdigest()
+
+    arrays, offset = None, 0
+    try:
+        with np.load(cache_path) as cache:
+            cached = {key: cache[key] for key in cache.files}
+        if str(cached.pop("source_head")) == head and int(cached["source_offset"]) <= stat.st_size:
+            offset = int(cached.pop("source_offset"))
+            size, mtime_ns = int(cached.pop("source_size")), int(cached.pop("source_mtime_ns"))
+            arrays = cached
+            if size == stat.st_size and mtime_ns == stat.st_mtime_ns:
+                return arrays
+    except (OSError, KeyError, ValueError, EOFError, zipfile.BadZipFile):
+        arrays, offset = None, 0  # No usable (or a truncated) cache; parse everything
+
+    with open(file_path, "rb") as file:
+        file.seek(offset)
+        chunk = file.read()
+    chunk = chunk[:chunk.rfind(b"\n") + 1]  # Leave a partly written last line for the next run
+
+    descriptions = arrays["descriptions"] if arrays is not None else None
+    new = extract_metrics(parse_stats_lines(chunk, file_path), descriptions)
+    arrays = append_arrays(arrays, new) if arrays is not None else new
+
+    # Write next to the cache and rename it into place, so a killed run never leaves a truncated cache
+    temp_path = f"{cache_path}.tmp"
+    try:
+        with open(temp_path, "wb") as file:
+            np.savez(
+                file,
+                source_head=np.array(head),
+                source_offset=np.array(offset + len(chunk)),
+                source_size=np.array(stat.st_size),
+                source_mtime_ns=np.array(stat.st_mtime_ns),
+                **arrays,
+            )
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        print(f"Failed to write stats cache '{cache_path}': {e}")
+    return arrays
 
 
 # Aggregate metrics
 def calculate_aggregate_metrics(total_times, active_times, maintenance_times):
-    if not total_times:
+    if not len(total_times):
         print("Error: No data available to calculate aggregate metrics. Exiting.")
         sys.exit(1)  # Exit if no data is available
+    p50, p90, p95 = np.percentile(total_times, [50, 90, 95])
     return {
-        "average_total_time": np.mean(total_times),
-        "average_active_time": np.mean(active_times),
-        "average_maintenance_time": np.mean(maintenance_times),
-        "max_total_time": max(total_times),
-        "min_total_time": min(total_times),
+        "average_total_time": float(np.mean(total_times)),
+        "average_active_time": float(np.mean(active_times)),
+        "average_maintenance_time": float(np.mean(maintenance_times)),
+        "max_total_time": float(np.max(total_times)),
+        "min_total_time": float(np.min(total_times)),
+        "p50_total_time": float(p50),
+        "p90_total_time": float(p90),
+        "p95_total_time": float(p95),
     }
 
 
 # Per-task analysis
-def per_task_analysis(task_stats):
+def per_task_analysis(arrays):
+    """Average and 95th percentile times per task description, grouped with bincount/argsort."""
+    task_ids = arrays["task_ids"]
+    descriptions = arrays["descriptions"]
+    counts = np.bincount(task_ids, minlength=len(descriptions))
+    safe_counts = np.maximum(counts, 1)
+
+    # Sort once by task so every task's samples are a contiguous slice for the percentiles
+    order = np.argsort(task_ids, kind="stable")
+    bounds = np.concatenate([[0], np.cumsum(counts)])
+    sorted_totals = arrays["task_total_times"][order]
+
     task_summaries = {}
-    for task in task_stats:
-        desc = task["description"]
-        if desc not in task_summaries:
-            task_summaries[desc] = {
-                "total_time": [],
-                "active_time": [],
-                "maintenance_time": [],
-            }
-        task_summaries[desc]["total_time"].append(task["total_time"])
-        task_summaries[desc]["active_time"].append(task["active_time"])
-        task_summaries[desc]["maintenance_time"].append(task["maintenance_time"])
+    means = {
+        key: np.bincount(task_ids, weights=arrays[f"task_{key}s"], minlength=len(descriptions)) / safe_counts
+        for key in ("total_time", "active_time", "maintenance_time")
+    }
+    for i, desc in enumerate(descriptions):
+        if not counts[i]:
+            continue
+        task_summaries[str(desc)] = {
+            "runs": int(counts[i]),
+            "total_time": float(means["total_time"][i]),
+            "active_time": float(means["active_time"][i]),
+            "maintenance_time": float(means["maintenance_time"][i]),
+            "p95_total_time": float(np.percentile(sorted_totals[bounds[i]:bounds[i + 1]], 95)),
+        }
     return task_summaries
 
 
@@ -134,10 +272,10 @@ def format_time(seconds):
 
 
 # Detect performance anomalies
-def detect_anomalies(total_times, threshold=1.5):
-    mean = np.mean(total_times)
-    std_dev = np.std(total_times)
-    anomalies = [i + 1 for i, time in enumerate(total_times) if abs(time - mean) > threshold * std_dev]
+def detect_anomalies(loops, total_times, threshold=1.5):
+    total_times = np.asarray(total_times, dtype=float)
+    deviation = np.abs(total_times - total_times.mean())
+    anomalies = np.asarray(loops)[deviation > threshold * total_times.std()].tolist()
 
     # Log anomalies to a file
     if anomalies:
@@ -158,8 +296,8 @@ def save_aggregate_metrics(aggregate_metrics):
 
 
 # Create visualizations
-def plot_metrics(loops, total_times, active_times, maintenance_times, aggregate_metrics, anomalies, stats):
-    if not loops or not total_times:
+def plot_metrics(loops, total_times, active_times, maintenance_times, aggregate_metrics, anomalies, timestamps):
+    if not len(loops) or not len(total_times):
         print("Error: No data available to generate metrics plot. Skipping visualization.")
         return  # Skip plotting
 
@@ -175,15 +313,8 @@ def plot_metrics(loops, total_times, active_times, maintenance_times, aggregate_
         plt.axvline(x=anomaly, color="red", linestyle="--", alpha=0.7, label=f"Anomaly at Loop {anomaly}")
 
     # Add aggregate metrics to the plot as annotations
-    try:
-        start_date = datetime.strptime(stats[0]["timestamp"], "%Y-%m-%dT%H:%M:%S.%f").strftime("%b %d, %Y")
-    except ValueError:
-        start_date = datetime.strptime(stats[0]["timestamp"], "%Y-%m-%dT%H:%M:%S").strftime("%b %d, %Y")
-
-    try:
-        end_date = datetime.strptime(stats[-1]["timestamp"], "%Y-%m-%dT%H:%M:%S.%f").strftime("%b %d, %Y")
-    except ValueError:
-        end_date = datetime.strptime(stats[-1]["timestamp"], "%Y-%m-%dT%H:%M:%S").strftime("%b %d, %Y")
+    start_date = datetime.fromisoformat(str(timestamps[0])).strftime("%b %d, %Y")
+    end_date = datetime.fromisoformat(str(timestamps[-1])).strftime("%b %d, %Y")
     plt.title(f"Task Stats Over Loops ({start_date} to {end_date})")
     plt.xlabel("Loop Number")
     plt.ylabel("Time (seconds)")
@@ -196,7 +327,8 @@ def plot_metrics(loops, total_times, active_times, maintenance_times, aggregate_
         f"Avg Active: {format_time(aggregate_metrics['average_active_time'])}",
         f"Avg Maintenance: {format_time(aggregate_metrics['average_maintenance_time'])}",
         f"Max Total: {format_time(aggregate_metrics['max_total_time'])}",
-        f"Min Total: {format_time(aggregate_metrics['min_total_time'])}"
+        f"Min Total: {format_time(aggregate_metrics['min_total_time'])}",
+        f"P95 Total: {format_time(aggregate_metrics['p95_total_time'])}"
     ])
 
     plt.gcf().text(0.02, 0.5, metrics_text, fontsize=10, va="center",
@@ -214,9 +346,9 @@ def plot_metrics(loops, total_times, active_times, maintenance_times, aggregate_
 def plot_per_task_analysis(task_summaries):
     plt.figure(figsize=(12, 8))
     tasks = list(task_summaries.keys())
-    total_times = [np.mean(task_summaries[task]["total_time"]) for task in tasks]
-    active_times = [np.mean(task_summaries[task]["active_time"]) for task in tasks]
-    maintenance_times = [np.mean(task_summaries[task]["maintenance_time"]) for task in tasks]
+    total_times = [task_summaries[task]["total_time"] for task in tasks]
+    active_times = [task_summaries[task]["active_time"] for task in tasks]
+    maintenance_times = [task_summaries[task]["maintenance_time"] for task in tasks]
 
     # Bar chart for per-task metrics
     x = np.arange(len(tasks))
@@ -244,11 +376,18 @@ def plot_per_task_analysis(task_summaries):
 # Main function to process data and visualize
 def main():
     setup_directories()
-    stats = load_stats()
-    loops, total_times, active_times, maintenance_times, task_stats = extract_metrics(stats)
+    arrays = load_stats_arrays()
+    if not len(arrays["loops"]):
+        print("Error: No data available in the stats file. Exiting.")
+        sys.exit(1)  # Exit if the data is empty
+
+    loops = arrays["loops"]
+    total_times = arrays["total_times"]
+    active_times = arrays["active_times"]
+    maintenance_times = arrays["maintenance_times"]
     aggregate_metrics = calculate_aggregate_metrics(total_times, active_times, maintenance_times)
-    anomalies = detect_anomalies(total_times, threshold=THRESHOLD)
-    task_summaries = per_task_analysis(task_stats)
+    anomalies = detect_anomalies(loops, total_times, threshold=THRESHOLD)
+    task_summaries = per_task_analysis(arrays)
 
     # Print aggregate metrics to the console
     print("\nAggregate Metrics:")
@@ -256,7 +395,8 @@ def main():
         print(f"  {key}: {value:.2f} seconds")
 
     # Plot overall metrics
-    plot_metrics(loops, total_times, active_times, maintenance_times, aggregate_metrics, anomalies, stats)
+    plot_metrics(loops, total_times, active_times, maintenance_times, aggregate_metrics, anomalies,
+                 arrays["timestamps"])
 
     # Plot per-task analysis
     plot_per_task_analysis(task_summaries)
@@ -0,0 +1,161 @@
+"""
+Shared logging setup for the scripts under pyprogs.
+
+Log records are put on a bounded queue and written by a background QueueListener thread,
+so logging never blocks the calling thread on disk or console I/O. Each script logs to
+logs/<script_name>.log, which is rolled over at startup and whenever it reaches
+LOG_MAX_BYTES, keeping MAX_LOG_FILES files in total.
+
+Usage from a script folder (e.g. pyprogs/resizer/resizer.py):
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from pyprogs_logging import setup_logging
+
+    log_filename = setup_logging(script_name, level=log_level, max_log_files=max_log_files)
+
+Process pool workers must not rely on the parent's handlers: with fork they inherit the queue
+handler but not the listener thread, so their records would be lost. Start pools with
+ProcessPoolExecutor(initializer=init_worker_logging), and return anything meant for the log
+file to the main process.
+
+Environment variables:
+    LOG_MAX_BYTES       size at which the log file is rotated (default 5 MB)
+    LOG_JSON            "true" to write JSON lines instead of plain text (default false)
+    LOG_QUEUE_SIZE      records buffered before new ones are dropped (default 10000)
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+# Pass as `extra=` to send a record to the console when setup_logging(console="flagged") is used
+CONSOLE = {"console": True}
+
+_listener = None
+_queue_handler = None
+_atexit_registered = False
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Format each record as one JSON object per line."""
+
+    def format(self, record):
+        data = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records instead of blocking or raising when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class ConsoleFilter(logging.Filter):
+    """Only pass records logged with extra=CONSOLE."""
+
+    def filter(self, record):
+        return getattr(record, "console", False)
+
+
+def setup_logging(script_name, logs_directory="logs", level="INFO", max_log_files=10, console=False,
+                  max_bytes=None, json_lines=None, log_format=LOG_FORMAT):
+    """
+    Configure the root logger to write through a background thread and return the log file path.
+
+    console: False for file only, True to also print every record to stdout,
+             or "flagged" to print only records logged with extra=CONSOLE.
+    """
+    global _listener, _queue_handler, _atexit_registered
+    if _listener is not None:
+        _listener.stop()
+
+    max_log_files = max(1, int(max_log_files))
+    if max_bytes is None:
+        max_bytes = int(os.getenv("LOG_MAX_BYTES", 5 * 1024 * 1024))
+    if json_lines is None:
+        json_lines = os.getenv("LOG_JSON", "false").lower() in ("1", "true", "yes")
+
+    os.makedirs(logs_directory, exist_ok=True)
+    log_filename = os.path.join(logs_directory, f"{script_name}.log{'.jsonl' if json_lines else ''}")
+
+    file_handler = RotatingFileHandler(log_filename, maxBytes=max_bytes, backupCount=max_log_files - 1,
+                                       encoding="utf-8", delay=True)
+    # Start every run in a fresh file; rotating renames at most max_log_files files
+    if os.path.exists(log_filename) and os.path.getsize(log_filename) > 0:
+        file_handler.doRollover()
+    file_handler.setFormatter(JsonLinesFormatter() if json_lines else logging.Formatter(log_format))
+    handlers = [file_handler]
+
+    if console:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(logging.Formatter("%(message)s" if console == "flagged" else log_format))
+        if console == "flagged":
+            console_handler.addFilter(ConsoleFilter())
+        handlers.append(console_handler)
+
+    log_queue = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", 10000)))
+    _listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    if not _atexit_registered:
+        atexit.register(stop_logging)
+        _atexit_registered = True
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    _queue_handler = DroppingQueueHandler(log_queue)
+    root.addHandler(_queue_handler)
+    root.setLevel(getattr(logging, str(level).upper(), logging.INFO) if isinstance(level, str) else level)
+    return log_filename
+
+
+def stop_logging():
+    """Flush queued records and stop the background writer. Safe to call more than once."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+        if _queue_handler is not None and _queue_handler.dropped:
+            try:
+                print(f"Logging queue was full; {_queue_handler.dropped} log records were dropped.", file=sys.stderr)
+            except (OSError, ValueError):
+                pass  # stderr may already be closed at exit
+
+
+def init_worker_logging(level=logging.WARNING):
+    """
+    Initializer for process pool workers. Drops the handlers inherited from the parent (whose
+    listener thread doesn't exist in the worker) and sends warnings and errors to stderr instead.
+    """
+    global _listener, _queue_handler
+    _listener = None
+    _queue_handler = None
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    root.addHandler(handler)
+    root.setLevel(level)
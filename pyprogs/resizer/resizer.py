@@ -1,12 +1,22 @@
 import argparse
-import glob
+import importlib.util
+import io
+import itertools
+import json
 import logging
+import math
+import multiprocessing
 import os
+import shutil
 import sys
 import time
-from datetime import datetime as dt
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from dotenv import load_dotenv, find_dotenv
-from PIL import Image
+from PIL import Image, features
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pyprogs_logging import init_worker_logging, setup_logging  # noqa: E402
 
 try:
     # Find the .env file
@@ -28,49 +38,30 @@ log_level = os.getenv('LOG_LEVEL', 'INFO').upper()  # Default logging level: INF
 # Extract the script name without the '.py' extension
 script_name = os.path.splitext(os.path.basename(sys.argv[0]))[0]
 
-# Define the logs directory
-logs_directory = "logs"
-
-# Ensure the "logs" directory exists
-if not os.path.exists(logs_directory):
-    os.makedirs(logs_directory)
-
-# Generate a unique log filename with timestamp and script name
-timestamp = dt.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
-log_filename = os.path.join(logs_directory, f"{script_name}_{timestamp}.log")
-
-# Set up logging with timestamps and the specified logging level
-log_format = '%(asctime)s - %(levelname)s - %(message)s'
-logging.basicConfig(filename=log_filename, level=getattr(logging, log_level), format=log_format)
+# Set up logging (shared by all pyprogs scripts) with the specified logging level.
+# Worker processes started with --workers re-import this module on Windows; only the main process logs.
+if multiprocessing.parent_process() is None:
+    log_filename = setup_logging(script_name, level=log_level, max_log_files=max_log_files)
 
 IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp", ".gif", ".tiff", ".tif")
 TARGET_RATIO = 1 / 1.5
-# Counter variables for different actions in resize_image function
-skipped_crop_images = 0
-cropped_sides_images = 0
-cropped_top_bottom_images = 0
-skipped_scale_images = 0
-scaled_up_images = 0
-scaled_down_images = 0
-total_images = 0
-processed_images = 0
-skipped_images = 0
-
-
-def clean_up_old_logs():
-    global max_log_files
-
-    # Set max_log_files to 1 if it's 0 or negative
-    if max_log_files <= 0:
-        max_log_files = 1
-
-    # Remove old log files from the 'logs' subdirectory if there are more than the allowed number
-    existing_logs = glob.glob(os.path.join(logs_directory, f"{script_name}_*.log"))
-    if len(existing_logs) > max_log_files:
-        logging.info(f"existing_logs: {len(existing_logs)} > max_log_files: {max_log_files}")
-        oldest_logs = sorted(existing_logs)[:-max_log_files]
-        for old_log in oldest_logs:
-            os.remove(old_log)
+REDUCING_GAP = 2.0  # Downsizes are first reduced in cheap integer steps down to this multiple of the target
+# Counters for the summary; resize_image reports which of the action counters apply to each image
+ACTION_COUNTERS = ("skipped_crop_images", "cropped_sides_images", "cropped_top_bottom_images",
+                   "skipped_scale_images", "scaled_up_images", "scaled_down_images")
+SUMMARY_COUNTERS = ("total_images", "processed_images", "unchanged_images", "skipped_images",
+                    "failed_images") + ACTION_COUNTERS
+MANIFEST_NAME = ".resizer_manifest.json"  # Kept in the output folder
+# Output formats: the Pillow format name, the file extension and the save options each one takes
+ENCODERS = {
+    "jpeg": {"format": "JPEG", "extension": ".jpg", "options": ("optimize", "progressive", "subsampling")},
+    "webp": {"format": "WEBP", "extension": ".webp", "options": ("method",)},
+    "avif": {"format": "AVIF", "extension": ".avif", "options": ("speed", "subsampling")},
+}
+# Encoder settings; None or False leaves Pillow's default, which is what resizer always used for JPEG
+DEFAULT_ENCODER = {"format": "jpeg", "quality": None, "optimize": False, "progressive": False, "subsampling": None,
+                   "method": None, "speed": None, "target_size": None, "target_ssim": None}
+QUALITY_RANGE = (30, 95)  # Range searched for --target-size and --target-ssim
 
 
 def get_formatted_duration(seconds):
@@ -90,91 +81,231 @@ def get_formatted_duration(seconds):
     return ' '.join(result)
 
 
-def resize_image(image_path, output_folder, min_width, max_width):
-    global skipped_crop_images
-    global cropped_sides_images
-    global cropped_top_bottom_images
-    global skipped_scale_images
-    global scaled_up_images
-    global scaled_down_images
-
-    # Open the image
-    image = Image.open(image_path)
-    original_width, original_height = image.size
+def plan_resize(width, height, min_width, max_width):
+    """
+    Work out the crop box (in source pixels) and the final size up front, so the image only has to be
+    resampled once. Returns (crop_box, output_size, actions), where actions are (counter, message) pairs
+    with a {path} placeholder in the message.
+    """
+    actions = []
 
     # Set target to original in case all is ok
-    target_width = original_width
-    target_height = original_height
+    target_width = width
+    target_height = height
+    crop_box = (0, 0, width, height)
 
-    if original_width / original_height == TARGET_RATIO:
-        # Skip the image if it is already in the desired aspect ratio
-        print(f"Skipped crop of {image_path} as it is already in the desired aspect ratio.")
-        logging.info(f"Skipped crop of {image_path} as it is already in the desired aspect ratio.")
-        skipped_crop_images += 1
+    if width / height == TARGET_RATIO:
+        # Skip the crop if the image is already in the desired aspect ratio
+        actions.append(("skipped_crop_images", "Skipped crop of {path} as it is already in the desired aspect ratio."))
 
-    if original_width / original_height > TARGET_RATIO:
+    if width / height > TARGET_RATIO:
         # If the image is wider than the target aspect ratio, crop the sides
-        target_height = original_height
-        target_width = int(target_height * TARGET_RATIO)
-        padding = (original_width - target_width) // 2
-        image = image.crop((padding, 0, original_width - padding, original_height))
-        print(f"Cropped sides {image_path} to desired aspect ratio.")
-        logging.info(f"Cropped sides {image_path} to desired aspect ratio.")
-        cropped_sides_images += 1
-
-    if original_width / original_height < TARGET_RATIO:
+        target_width = int(height * TARGET_RATIO)
+        padding = (width - target_width) // 2
+        crop_box = (padding, 0, width - padding, height)
+        actions.append(("cropped_sides_images", "Cropped sides {path} to desired aspect ratio."))
+
+    if width / height < TARGET_RATIO:
         # If the image is taller than the target aspect ratio, crop the top and bottom
-        target_width = original_width
-        target_height = int(target_width / TARGET_RATIO)
-        padding = (original_height - target_height) // 2
-        image = image.crop((0, padding, original_width, original_height - padding))
-        print(f"Cropped top and bottom {image_path} to desired aspect ratio.")
-        logging.info(f"Cropped top and bottom {image_path} to desired aspect ratio.")
-        cropped_top_bottom_images += 1
-
-    # Resize the image to the target dimensions using Lanczos resampling
-    resized_image = image.resize((target_width, target_height), Image.LANCZOS)
-
-    # Scale up or down the image width to meet the desired range (1000 to 2000)
-    resized_width = resized_image.width
-    if resized_width < min_width:
-        resized_image = resized_image.resize((min_width, int(min_width / TARGET_RATIO)), Image.LANCZOS)
-        print(f"Scaled up {image_path} to {min_width}.")
-        logging.info(f"Scaled up {image_path} to {min_width}.")
-        scaled_up_images += 1
-
-    if resized_width > max_width:
-        resized_image = resized_image.resize((max_width, int(max_width / TARGET_RATIO)), Image.LANCZOS)
-        print(f"Scaled down {image_path} to {max_width}.")
-        logging.info(f"Scaled down {image_path} to {max_width}.")
-        scaled_down_images += 1
-
-    if resized_width == min_width:
-        print(f"Skipped scale up {image_path} to {min_width}.")
-        logging.info(f"Skipped scale up {image_path} to {min_width}.")
-        skipped_scale_images += 1
-
-    if resized_width == max_width:
-        print(f"Skipped scale down {image_path} to {max_width}.")
-        logging.info(f"Skipped scale down {image_path} to {max_width}.")
-        skipped_scale_images += 1
-
-    # Save the resized image as a JPG
-    output_filename = os.path.splitext(os.path.basename(image_path))[0] + ".jpg"
-    output_path = os.path.join(output_folder, output_filename)
-    resized_image.save(output_path, "JPEG")
-    print(f"Processed: {image_path} -> {output_path}")
-    logging.info(f"Processed: {image_path} -> {output_path}")
+        target_height = int(width / TARGET_RATIO)
+        padding = (height - target_height) // 2
+        crop_box = (0, padding, width, height - padding)
+        actions.append(("cropped_top_bottom_images", "Cropped top and bottom {path} to desired aspect ratio."))
+
+    # Scale up or down the width to meet the desired range (1000 to 2000)
+    output_size = (target_width, target_height)
+    if target_width < min_width:
+        output_size = (min_width, int(min_width / TARGET_RATIO))
+        actions.append(("scaled_up_images", f"Scaled up {{path}} to {min_width}."))
+
+    if target_width > max_width:
+        output_size = (max_width, int(max_width / TARGET_RATIO))
+        actions.append(("scaled_down_images", f"Scaled down {{path}} to {max_width}."))
+
+    if target_width == min_width:
+        actions.append(("skipped_scale_images", f"Skipped scale up {{path}} to {min_width}."))
+
+    if target_width == max_width:
+        actions.append(("skipped_scale_images", f"Skipped scale down {{path}} to {max_width}."))
+
+    return crop_box, output_size, actions
+
+
+def encoder_available(name):
+    """Return True if this Pillow build can write the given output format."""
+    return name == "jpeg" or features.check(name)
+
+
+def is_passthrough(encoder):
+    """
+    An unchanged JPEG can be copied as-is only when it would otherwise be re-encoded with the defaults;
+    any other encoder setting (quality, progressive, optimize, subsampling, targets, ...) needs a re-encode.
+    """
+    return encoder == DEFAULT_ENCODER
+
+
+def ssim(reference, candidate):
+    """
+    Mean structural similarity of two images of the same size, on their luminance in 8x8 blocks.
+    Needs numpy, which is only required for --target-ssim.
+    """
+    import numpy
+
+    x = numpy.asarray(reference.convert("L"), dtype=numpy.float64)
+    y = numpy.asarray(candidate.convert("L"), dtype=numpy.float64)
+    height, width = (x.shape[0] // 8) * 8, (x.shape[1] // 8) * 8
+    x = x[:height, :width].reshape(height // 8, 8, width // 8, 8)
+    y = y[:height, :width].reshape(height // 8, 8, width // 8, 8)
+    mu_x, mu_y = x.mean(axis=(1, 3)), y.mean(axis=(1, 3))
+    var_x, var_y = x.var(axis=(1, 3)), y.var(axis=(1, 3))
+    covariance = ((x - mu_x[:, None, :, None]) * (y - mu_y[:, None, :, None])).mean(axis=(1, 3))
+    c1, c2 = (0.01 * 255) ** 2, (0.03 * 255) ** 2
+    return float((((2 * mu_x * mu_y + c1) * (2 * covariance + c2)) /
+                  ((mu_x ** 2 + mu_y ** 2 + c1) * (var_x + var_y + c2))).mean())
+
+
+def encode_image(image, encoder):
+    """
+    Encode image with the encoder settings and return the bytes. With a target size (bytes) the highest
+    quality that fits is searched for, with a target SSIM the lowest quality that reaches it.
+    """
+    spec = ENCODERS[encoder["format"]]
+    if spec["format"] == "JPEG" and image.mode not in ("RGB", "L", "CMYK"):
+        image = image.convert("RGB")
+    options = {name: encoder[name] for name in spec["options"] if encoder[name] not in (None, False)}
+
+    def encode(quality):
+        buffer = io.BytesIO()
+        if quality is None:
+            image.save(buffer, spec["format"], **options)
+        else:
+            image.save(buffer, spec["format"], quality=quality, **options)
+        return buffer.getvalue()
+
+    if encoder["target_size"] is None and encoder["target_ssim"] is None:
+        return encode(encoder["quality"])
+
+    def meets_target(data):
+        if encoder["target_size"] is not None:
+            return len(data) <= encoder["target_size"]
+        with Image.open(io.BytesIO(data)) as encoded:
+            return ssim(image, encoded) >= encoder["target_ssim"]
+
+    # Size falls and similarity rises with quality, so binary search the quality range
+    low, high = QUALITY_RANGE
+    best = None
+    while low <= high:
+        quality = (low + high) // 2
+        data = encode(quality)
+        if meets_target(data):
+            best = data
+            if encoder["target_size"] is not None:
+                low = quality + 1
+            else:
+                high = quality - 1
+        elif encoder["target_size"] is not None:
+            high = quality - 1
+        else:
+            low = quality + 1
+    if best is None:
+        # Nothing in the range reaches the target; get as close as the range allows
+        best = encode(QUALITY_RANGE[0] if encoder["target_size"] is not None else QUALITY_RANGE[1])
+    return best
+
+
+@contextmanager
+def atomic_output(output_path):
+    """Yield a temporary path next to output_path and move it into place once it has been written."""
+    temp_path = f"{output_path}.{os.getpid()}.tmp"
+    try:
+        yield temp_path
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
 
 
-def process_images(input_folder, output_folder, min_width, max_width):
-    # Create the output folder if it doesn't exist
-    os.makedirs(output_folder, exist_ok=True)
+def resample(image, crop_box, output_size):
+    """Crop and scale an opened image in a single resample, as planned by plan_resize."""
+    original_width, original_height = image.size
+    box_width, box_height = crop_box[2] - crop_box[0], crop_box[3] - crop_box[1]
+    # For big downsizes let the JPEG decoder scale by 1/2, 1/4 or 1/8 first, keeping at least
+    # REDUCING_GAP times the pixels the crop needs (the same approach as Image.thumbnail)
+    draft = image.draft(None, (
+        math.ceil(original_width * output_size[0] / box_width * REDUCING_GAP),
+        math.ceil(original_height * output_size[1] / box_height * REDUCING_GAP),
+    ))
+    if draft:
+        scale = original_width / draft[1][2]
+        crop_box = tuple(edge / scale for edge in crop_box)
+    return image.resize(output_size, Image.LANCZOS, box=crop_box, reducing_gap=REDUCING_GAP)
+
+
+def resize_image(image_path, output_folder, min_width, max_width, encoder=DEFAULT_ENCODER):
+    """
+    Crop an image to the target aspect ratio, scale it into the width range and save it in the
+    encoder's format. The crop and scale are done in a single resample. A JPEG that already has
+    the right ratio and width is copied without being decoded when the output is a default JPEG.
+    The output file is written under a temporary name and then renamed, so it is never left half written.
+    Returns a result record with the actions taken and the messages to log. This can run in a worker
+    process, so it doesn't update counters or log itself; the main process does that in handle_result.
+    """
+    result = {"image_path": image_path, "output_path": None, "actions": [], "messages": [], "error": None}
+
+    output_filename = os.path.splitext(os.path.basename(image_path))[0] + ENCODERS[encoder["format"]]["extension"]
+    output_path = os.path.join(output_folder, output_filename)
 
-    # Traverse the input folder and process each image
-    global total_images
-    global processed_images
-    global skipped_images
+    # Opening only reads the header; pixels are decoded when the image is resized
+    with Image.open(image_path) as image:
+        original_width, original_height = image.size
+        crop_box, output_size, actions = plan_resize(original_width, original_height, min_width, max_width)
+        for action, message in actions:
+            result["actions"].append(action)
+            result["messages"].append(message.format(path=image_path))
+
+        unchanged = crop_box == (0, 0, original_width, original_height) and output_size == image.size
+        if unchanged and image.format == "JPEG" and is_passthrough(encoder):
+            if os.path.abspath(image_path) != os.path.abspath(output_path):
+                with atomic_output(output_path) as temp_path:
+                    shutil.copyfile(image_path, temp_path)
+        else:
+            data = encode_image(resample(image, crop_box, output_size), encoder)
+            with atomic_output(output_path) as temp_path:
+                with open(temp_path, "wb") as file:
+                    file.write(data)
+
+    result["output_path"] = output_path
+    result["messages"].append(f"Processed: {image_path} -> {output_path}")
+    return result
+
+
+def resize_image_safely(image_path, output_folder, min_width, max_width, encoder=DEFAULT_ENCODER):
+    """Run resize_image, turning an exception into a failed result so one bad file doesn't stop the batch."""
+    try:
+        return resize_image(image_path, output_folder, min_width, max_width, encoder)
+    except Exception as e:
+        return {"image_path": image_path, "output_path": None, "actions": [], "messages": [], "error": str(e)}
+
+
+def handle_result(result, counters):
+    """Log a result record from resize_image and add it to the counters."""
+    for message in result["messages"]:
+        print(message)
+        logging.info(message)
+    for action in result["actions"]:
+        counters[action] += 1
+    if result["error"]:
+        print(f"Failed to process {result['image_path']}: {result['error']}")
+        logging.error(f"Failed to process {result['image_path']}: {result['error']}")
+        counters["failed_images"] += 1
+    else:
+        counters["processed_images"] += 1
+
+
+def find_images(input_folder, counters):
+    """Yield the supported image files under input_folder, counting the ones that are skipped."""
+    if not os.path.isdir(input_folder):
+        raise FileNotFoundError(f"Input folder not found: {input_folder}")
 
     for root, _, files in os.walk(input_folder):
         for file in files:
@@ -185,14 +316,136 @@ def process_images(input_folder, output_folder, min_width, max_width):
                 # Log or print the skipped image information
                 print(f"Skipped image {file_path} due to unsupported file extension.")
                 logging.info(f"Skipped image {file_path} due to unsupported file extension.")
-                skipped_images += 1
+                counters["skipped_images"] += 1
+                continue
+
+            counters["total_images"] += 1
+            yield file_path
+
+
+class ResizeManifest:
+    """
+    Inputs that were already resized into the output folder: source path -> the source's size and
+    mtime, the settings used and the output file. An input whose size, mtime and settings still match,
+    and whose output still exists, is skipped after a single stat.
+    """
+
+    def __init__(self, output_folder, settings):
+        self.manifest_file = os.path.join(output_folder, MANIFEST_NAME)
+        self.settings = settings
+        self.entries = {}
+        self.pending = {}
+        if os.path.exists(self.manifest_file):
+            try:
+                with open(self.manifest_file, "r", encoding="utf-8") as file:
+                    self.entries = json.load(file)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Could not read {self.manifest_file}, starting a new manifest: {e}")
+        self.outputs = set(os.listdir(output_folder))
+
+    def is_current(self, image_path):
+        """Return True if image_path is unchanged since it was last resized with the same settings."""
+        stat = os.stat(image_path)
+        key = os.path.abspath(image_path)
+        source = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        entry = self.entries.get(key)
+        if (entry is not None and entry["source"] == source and entry["settings"] == self.settings
+                and entry["output"] in self.outputs):
+            return True
+        self.pending[key] = source
+        return False
+
+    def record(self, image_path, output_path):
+        """Remember that image_path was resized to output_path."""
+        key = os.path.abspath(image_path)
+        source = self.pending.pop(key, None)
+        if source is not None:
+            self.entries[key] = {"source": source, "settings": self.settings,
+                                 "output": os.path.basename(output_path)}
+
+    def save(self):
+        temp_path = f"{self.manifest_file}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(self.entries, file)
+        os.replace(temp_path, self.manifest_file)
+
+
+def process_images(input_folder, output_folder, min_width, max_width, workers=1, force=False,
+                   encoder=DEFAULT_ENCODER):
+    """
+    Resize every new or changed image under input_folder and return the summary counters.
+    With workers > 1 the images are spread over a pool of processes; results are
+    handled in the main process in the same order as the files were found.
+    With force, images are processed even if the manifest says they are unchanged.
+    """
+    # Create the output folder if it doesn't exist
+    os.makedirs(output_folder, exist_ok=True)
+    counters = dict.fromkeys(SUMMARY_COUNTERS, 0)
+    manifest = ResizeManifest(output_folder, {"min_width": min_width, "max_width": max_width,
+                                              "target_ratio": TARGET_RATIO, "encoder": encoder})
+
+    def changed_images():
+        for file_path in find_images(input_folder, counters):
+            if manifest.is_current(file_path) and not force:
+                logging.debug(f"Unchanged since the last run, skipped: {file_path}")
+                counters["unchanged_images"] += 1
                 continue
+            yield file_path
 
-            total_images += 1
+    def handle(result):
+        handle_result(result, counters)
+        if not result["error"]:
+            manifest.record(result["image_path"], result["output_path"])
 
-            # Resize the image and save it
-            resize_image(file_path, output_folder, min_width, max_width)
-            processed_images += 1
+    try:
+        if workers <= 1:
+            for file_path in changed_images():
+                handle(resize_image_safely(file_path, output_folder, min_width, max_width, encoder))
+            return counters
+
+        image_paths = list(changed_images())
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker_logging) as executor:
+            results = executor.map(resize_image_safely, image_paths, [output_folder] * len(image_paths),
+                                   [min_width] * len(image_paths), [max_width] * len(image_paths),
+                                   [encoder] * len(image_paths),
+                                   chunksize=max(1, min(32, len(image_paths) // (workers * 4))))
+            for result in results:
+                handle(result)
+        return counters
+    finally:
+        manifest.save()
+
+
+def benchmark(input_folder, min_width, max_width, encoder, sample_size):
+    """
+    Resize up to sample_size images from input_folder and encode each one in every format this Pillow
+    build can write, without saving anything. Returns the number of images and (label, total bytes,
+    encode seconds) rows; the first row is the baseline, a JPEG with Pillow's defaults.
+    """
+    counters = dict.fromkeys(SUMMARY_COUNTERS, 0)
+    image_paths = list(itertools.islice(find_images(input_folder, counters), sample_size))
+    candidates = [("jpeg (baseline)", DEFAULT_ENCODER)]
+    candidates += [(name, dict(encoder, format=name)) for name in ENCODERS if encoder_available(name)]
+    totals = {label: [0, 0.0] for label, _ in candidates}
+
+    image_count = 0
+    for image_path in image_paths:
+        try:
+            with Image.open(image_path) as image:
+                crop_box, output_size, _ = plan_resize(image.width, image.height, min_width, max_width)
+                resized_image = resample(image, crop_box, output_size)
+        except Exception as e:
+            print(f"Failed to process {image_path}: {e}")
+            logging.error(f"Failed to process {image_path}: {e}")
+            continue
+        image_count += 1
+        for label, settings in candidates:
+            start = time.perf_counter()
+            data = encode_image(resized_image, settings)
+            totals[label][0] += len(data)
+            totals[label][1] += time.perf_counter() - start
+
+    return image_count, [(label, size, seconds) for label, (size, seconds) in totals.items()]
 
 
 if __name__ == "__main__":
@@ -202,19 +455,66 @@ if __name__ == "__main__":
     parser.add_argument('--output-folder', default='output', help='Path to the folder where resized images will be saved.')
     parser.add_argument('--min-width', type=int, default=1000, help='Minimum width for resizing images.')
     parser.add_argument('--max-width', type=int, default=2000, help='Maximum width for resizing images.')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='Number of processes resizing images at once (default: 1, 0 for one per CPU).')
+    parser.add_argument('--force', action='store_true',
+                        help='Process every image, even the ones that are unchanged since the last run.')
+    parser.add_argument('--format', choices=list(ENCODERS), default='jpeg', help='Output format (default: jpeg).')
+    parser.add_argument('--quality', type=int, help="Encoder quality (default: Pillow's default for the format).")
+    parser.add_argument('--optimize', action='store_true', help='JPEG: optimize the Huffman tables.')
+    parser.add_argument('--progressive', action='store_true', help='JPEG: write a progressive JPEG.')
+    parser.add_argument('--subsampling', choices=['4:4:4', '4:2:2', '4:2:0'], help='JPEG and AVIF: chroma subsampling.')
+    parser.add_argument('--method', type=int, choices=range(7), metavar='0-6',
+                        help='WebP: compression effort, higher is smaller and slower.')
+    parser.add_argument('--speed', type=int, choices=range(11), metavar='0-10',
+                        help='AVIF: encoder speed, lower is smaller and slower.')
+    parser.add_argument('--target-size', type=int, metavar='KB',
+                        help='Use the highest quality that keeps each image under this many kilobytes.')
+    parser.add_argument('--target-ssim', type=float, metavar='SSIM',
+                        help='Use the lowest quality whose SSIM against the resized image reaches this (e.g. 0.95). '
+                             'Needs numpy.')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='Do not write anything; report the size and encode time of each format on a sample.')
+    parser.add_argument('--sample', type=int, default=20, help='Number of images used by --benchmark (default: 20).')
 
     args = parser.parse_args()
 
+    if not encoder_available(args.format):
+        parser.error(f"This Pillow build cannot write {args.format} files.")
+    if args.target_size is not None and args.target_ssim is not None:
+        parser.error("Use either --target-size or --target-ssim, not both.")
+    if args.target_ssim is not None and importlib.util.find_spec("numpy") is None:
+        parser.error("--target-ssim needs numpy (pip install numpy).")
+    encoder = dict(DEFAULT_ENCODER, format=args.format, quality=args.quality, optimize=args.optimize,
+                   progressive=args.progressive, subsampling=args.subsampling, method=args.method,
+                   speed=args.speed, target_ssim=args.target_ssim,
+                   target_size=args.target_size * 1024 if args.target_size is not None else None)
+
     # Log the command along with its arguments
     logging.info(f"Command: {' '.join(['python'] + os.sys.argv)}")
     logging.info(f"Arguments: {args}")
 
     try:
+        if args.benchmark:
+            image_count, rows = benchmark(args.input_folder, args.min_width, args.max_width, encoder, args.sample)
+            print(f"Benchmark of {image_count} images:")
+            logging.info(f"Benchmark of {image_count} images:")
+            baseline_size = rows[0][1]
+            for label, size, seconds in rows:
+                saved = baseline_size - size
+                line = (f"{label}: {size} bytes, saved {saved} bytes ({saved / max(baseline_size, 1):.1%}), "
+                        f"encode time {seconds:.3f}s ({seconds / max(image_count, 1) * 1000:.1f} ms per image)")
+                print(line)
+                logging.info(line)
+            sys.exit(0)
+
         # Record start time
         start_time = time.time()
 
         # Process the images
-        process_images(args.input_folder, args.output_folder, args.min_width, args.max_width)
+        workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+        counters = process_images(args.input_folder, args.output_folder, args.min_width, args.max_width, workers,
+                                  force=args.force, encoder=encoder)
 
         # Record end time
         end_time = time.time()
@@ -230,30 +530,25 @@ if __name__ == "__main__":
         logging.info(f"Script duration: {formatted_duration}")
 
         # Log detailed summary based on resize_image function
+        summary = [
+            ("Total Images Processed", counters["total_images"]),
+            ("Processed Images", counters["processed_images"]),
+            ("Unchanged Images", counters["unchanged_images"]),
+            ("Skipped Images", counters["skipped_images"]),
+            ("Failed Images", counters["failed_images"]),
+            ("Skipped Crop Images", counters["skipped_crop_images"]),
+            ("Skipped Scale Images", counters["skipped_scale_images"]),
+            ("Cropped Sides Images", counters["cropped_sides_images"]),
+            ("Cropped Top and Bottom Images", counters["cropped_top_bottom_images"]),
+            ("Scaled Up Images", counters["scaled_up_images"]),
+            ("Scaled Down Images", counters["scaled_down_images"]),
+        ]
         print("Detailed Summary:")
-        print(f"Total Images Processed: {total_images}")
-        print(f"Processed Images: {processed_images}")
-        print(f"Skipped Images: {skipped_images}")
-        print(f"Skipped Crop Images: {skipped_crop_images}")
-        print(f"Skipped Scale Images: {skipped_scale_images}")
-        print(f"Cropped Sides Images: {cropped_sides_images}")
-        print(f"Cropped Top and Bottom Images: {cropped_top_bottom_images}")
-        print(f"Scaled Up Images: {scaled_up_images}")
-        print(f"Scaled Down Images: {scaled_down_images}")
         logging.info("Detailed Summary:")
-        logging.info(f"Total Images Processed: {total_images}")
-        logging.info(f"Processed Images: {processed_images}")
-        logging.info(f"Skipped Images: {skipped_images}")
-        logging.info(f"Skipped Crop Images: {skipped_crop_images}")
-        logging.info(f"Skipped Scale Images: {skipped_scale_images}")
-        logging.info(f"Cropped Sides Images: {cropped_sides_images}")
-        logging.info(f"Cropped Top and Bottom Images: {cropped_top_bottom_images}")
-        logging.info(f"Scaled Up Images: {scaled_up_images}")
-        logging.info(f"Scaled Down Images: {scaled_down_images}")
+        for label, value in summary:
+            print(f"{label}: {value}")
+            logging.info(f"{label}: {value}")
 
     except FileNotFoundError as e:
         # Log an error if the input folder is not found
         logging.error(f"Error: {e}")
-    finally:
-        # Call the clean_up_old_logs function
-        clean_up_old_logs()